@@ -1 +1,10 @@
 from .memoize import *
+from .aio import *
+from .codec import *
+from .entries import *
+from .flight import *
+from .keys import *
+from .metrics import *
+from .policies import *
+from .shared import *
+from .tiered import *
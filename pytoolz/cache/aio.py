@@ -0,0 +1,178 @@
+import abc
+import inspect
+
+from pytoolz.cache.codec import Codec
+from pytoolz.cache.entries import MISS
+
+__all__ = ["AsyncCacheEngine", "AsyncInMemoryEngine", "AsyncRedisEngine", "AsyncMemcachedEngine", "resolve"]
+
+
+async def resolve(value):
+    """
+    Await the value if it is awaitable, used to call both sync and async engines
+
+    >>> import asyncio
+    >>> asyncio.run(resolve(1))
+    1
+    >>> asyncio.run(resolve(asyncio.sleep(0, result=2)))
+    2
+    """
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
+
+class AsyncCacheEngine(metaclass=abc.ABCMeta):
+    """
+    Interface used to define asynchronous Cache backends.
+    get returns the MISS sentinel when the key is not found, so that falsy values are valid entries.
+    Backends storing bytes use a Codec to serialize (and compress) values
+    """
+    codec = None
+
+    def _encode(self, value):
+        return value if self.codec is None else self.codec.encode(value)
+
+    def _decode(self, data):
+        return data if self.codec is None else self.codec.decode(data)
+
+    @abc.abstractmethod
+    async def get(self, key):
+        """
+        :return: the cached value or MISS
+        """
+        pass
+
+    @abc.abstractmethod
+    async def set(self, key, value, expiry):
+        pass
+
+    async def add(self, key, value, expiry) -> bool:
+        """
+        Atomically set the key only if it does not exist, return True if the value has been stored.
+        """
+        raise NotImplementedError(f"{self.__class__.__name__} does not support atomic add")
+
+    async def delete(self, key):
+        raise NotImplementedError(f"{self.__class__.__name__} does not support delete")
+
+    async def get_many(self, keys) -> dict:
+        """
+        Bulk get, backends should override it using a single round trip
+        :param keys: iterable of keys
+        :return: dict containing the found keys only
+        """
+        entries = {}
+        for key in keys:
+            entry = await self.get(key)
+            if entry is not MISS:
+                entries[key] = entry
+        return entries
+
+    async def set_many(self, mapping: dict, expiry):
+        for key, value in mapping.items():
+            await self.set(key, value, expiry)
+
+    async def delete_many(self, keys):
+        for key in keys:
+            await self.delete(key)
+
+    async def close(self):
+        pass
+
+
+class AsyncInMemoryEngine(AsyncCacheEngine):
+    """
+    In process engine exposing the async interface, it never blocks the event loop
+
+    >>> import asyncio
+    >>> engine = AsyncInMemoryEngine(2)
+    >>> asyncio.run(engine.set("a", 1))
+    >>> asyncio.run(engine.get("a"))
+    1
+    >>> asyncio.run(engine.get("c"))
+    MISS
+    """
+
+    def __init__(self, limit: int, expiration: int = 0, codec: Codec = None):
+        from pytoolz.cache.memoize import InMemoryEngine
+        self._engine = InMemoryEngine(limit, expiration=expiration, codec=codec)
+        self.codec = self._engine.codec
+
+    async def get(self, key):
+        return self._engine.get(key)
+
+    async def set(self, key, value, expiry=None):
+        self._engine.set(key, value, expiry)
+
+
+class AsyncRedisEngine(AsyncCacheEngine):
+    def __init__(self, host: str = "localhost", port: int = 6379, max_connections: int = 10, codec: Codec = None):
+        import redis.asyncio as aioredis
+        self._pool = aioredis.ConnectionPool(host=host, port=port, max_connections=max_connections)
+        self._client = aioredis.Redis(connection_pool=self._pool)
+        self.codec = codec or Codec()
+
+    async def get(self, key):
+        entry = await self._client.get(key)
+        return MISS if entry is None else self._decode(entry)
+
+    async def set(self, key, value, expiry):
+        await self._client.set(key, self._encode(value), ex=expiry)
+
+    async def add(self, key, value, expiry):
+        return bool(await self._client.set(key, self._encode(value), ex=expiry, nx=True))
+
+    async def delete(self, key):
+        await self._client.delete(key)
+
+    async def get_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        entries = await self._client.mget(keys)
+        return {key: self._decode(entry) for key, entry in zip(keys, entries) if entry is not None}
+
+    async def set_many(self, mapping, expiry):
+        async with self._client.pipeline(transaction=False) as pipeline:
+            for key, value in mapping.items():
+                pipeline.set(key, self._encode(value), ex=expiry)
+            await pipeline.execute()
+
+    async def delete_many(self, keys):
+        keys = list(keys)
+        if keys:
+            await self._client.delete(*keys)
+
+    async def close(self):
+        await self._pool.disconnect()
+
+
+class AsyncMemcachedEngine(AsyncCacheEngine):
+    def __init__(self, host: str = "localhost", port: int = 11211, pool_size: int = 10, codec: Codec = None):
+        import aiomcache
+        self._client = aiomcache.Client(host, port, pool_size=pool_size)
+        self.codec = codec or Codec()
+
+    async def get(self, key):
+        entry = await self._client.get(key.encode())
+        return MISS if entry is None else self._decode(entry)
+
+    async def set(self, key, value, expiry):
+        await self._client.set(key.encode(), self._encode(value), exptime=expiry or 0)
+
+    async def add(self, key, value, expiry):
+        return await self._client.add(key.encode(), self._encode(value), exptime=expiry or 0)
+
+    async def delete(self, key):
+        await self._client.delete(key.encode())
+
+    async def get_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        entries = await self._client.multi_get(*[key.encode() for key in keys])
+        return {key: self._decode(entry) for key, entry in zip(keys, entries) if entry is not None}
+
+    async def close(self):
+        await self._client.close()
@@ -0,0 +1,153 @@
+import importlib
+import struct
+import zlib
+
+from pytoolz.cache.entries import CachedException, Entry
+from pytoolz.serialization import BaseSerializer, Pickle
+
+try:
+    import lz4.frame as lz4  # faster
+except ImportError:
+    lz4 = None
+
+__all__ = ["Codec", ]
+
+_RAW = b"\x00"
+_ZLIB = b"\x01"
+_LZ4 = b"\x02"
+# high bits of the flag byte: memoize wrappers encoded by serializers that can't encode them (Json, Msgpack)
+_COMPRESSION_MASK = 0x0F
+_ENTRY = 0x10
+_EXCEPTION = 0x20
+_DEADLINES = struct.Struct("<dd")
+
+
+class Codec:
+    """
+    Value codec used by cache engines: serialize values using a pytoolz.serialization serializer
+    and compress the payloads bigger than a threshold (lz4 if installed, zlib otherwise).
+    Every payload is prefixed by one byte telling how it has been compressed, so payloads
+    written with a different compressor can always be decoded.
+
+    Basic Usage:
+    >>> codec = Codec(compress_threshold=100)
+    >>> codec.decode(codec.encode([1, 2, 3]))
+    [1, 2, 3]
+    >>> data = codec.encode("x" * 10000)
+    >>> len(data) < 1000
+    True
+    >>> codec.decode(data) == "x" * 10000
+    True
+    >>> codec.stats()["compressed"]
+    1
+
+    JSON values
+    >>> from pytoolz.serialization import Json
+    >>> Codec(Json).encode({"a": 1})
+    b'\\x00{"a": 1}'
+
+    memoize wrappers (stale_ttl / refresh_ahead entries, cached exceptions) are supported by every serializer:
+    with Json and Msgpack the value of an Entry must be serializable by them, a cached exception is stored
+    as its type (qualified name) and args, and must be re-creatable from them
+    >>> Codec(Json).decode(Codec(Json).encode(Entry({"a": 1}, 10.0, 20.0)))
+    Entry(value={'a': 1}, soft_deadline=10.0, hard_deadline=20.0)
+    >>> Codec(Json).decode(Codec(Json).encode(CachedException(KeyError("user")))).reraise()
+    Traceback (most recent call last):
+        ...
+    KeyError: 'user'
+
+    :param serializer: BaseSerializer implementation (Pickle, Json, Msgpack)
+    :param compress_threshold: min size in bytes of the payloads to compress, None to disable compression
+    :param compressor: "lz4" or "zlib", by default lz4 if available
+    :param level: compression level
+    """
+
+    def __init__(self, serializer=Pickle, compress_threshold: int = 1024, compressor: str = None, level: int = 1):
+        if not issubclass(serializer, BaseSerializer):
+            raise TypeError(f"{serializer} is not a BaseSerializer implementation")
+        compressor = compressor or ("lz4" if lz4 is not None else "zlib")
+        if compressor == "lz4" and lz4 is None:
+            raise ValueError("lz4 compression requires the lz4 package")
+        if compressor not in ("lz4", "zlib"):
+            raise ValueError(f"Unknown compressor: {compressor}")
+
+        self.serializer = serializer
+        self.compress_threshold = compress_threshold
+        self.compressor = compressor
+        self.level = level
+        self.bytes_in = self.bytes_out = self.encoded = self.compressed = 0
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.compressor == "lz4":
+            return _LZ4 + lz4.compress(data, compression_level=self.level)
+        return _ZLIB + zlib.compress(data, self.level)
+
+    def _serialize(self, value) -> bytes:
+        data = self.serializer(value).serialize()
+        return data.encode() if isinstance(data, str) else data
+
+    def _wrap(self, value) -> tuple:
+        """
+        Kind flag and data of a value, memoize wrappers are split in serializable parts unless pickled
+        """
+        kind = type(value)
+        if kind is Entry and not issubclass(self.serializer, Pickle):
+            return _ENTRY, _DEADLINES.pack(value.soft_deadline, value.hard_deadline) + self._serialize(value.value)
+        if kind is CachedException and not issubclass(self.serializer, Pickle):
+            error = type(value.exception)
+            return _EXCEPTION, self._serialize([error.__module__, error.__qualname__, list(value.exception.args)])
+        return 0, self._serialize(value)
+
+    def _unwrap(self, kind: int, data: bytes):
+        if kind == _ENTRY:
+            soft_deadline, hard_deadline = _DEADLINES.unpack_from(data)
+            return Entry(self.serializer(data[_DEADLINES.size:]).deserialize(), soft_deadline, hard_deadline)
+        if kind == _EXCEPTION:
+            module, qualname, args = self.serializer(data).deserialize()
+            error = importlib.import_module(module)
+            for name in qualname.split("."):
+                error = getattr(error, name)
+            if not (isinstance(error, type) and issubclass(error, BaseException)):
+                raise ValueError(f"Cannot decode cached exception: {module}.{qualname} is not an exception type")
+            return CachedException(error(*args))
+        return self.serializer(data).deserialize()
+
+    def encode(self, value) -> bytes:
+        kind, data = self._wrap(value)
+
+        size = len(data)
+        payload = None
+        if self.compress_threshold is not None and size >= self.compress_threshold:
+            payload = self._compress(data)
+            if len(payload) >= size:
+                payload = None
+            else:
+                self.compressed += 1
+        if payload is None:
+            payload = _RAW + data
+        if kind:
+            payload = bytes((payload[0] | kind,)) + payload[1:]
+
+        self.encoded += 1
+        self.bytes_in += size
+        self.bytes_out += len(payload)
+        return payload
+
+    def decode(self, payload: bytes):
+        kind, flag, data = payload[0] & ~_COMPRESSION_MASK, bytes((payload[0] & _COMPRESSION_MASK,)), payload[1:]
+        if flag == _ZLIB:
+            data = zlib.decompress(data)
+        elif flag == _LZ4:
+            if lz4 is None:
+                raise ValueError("Cannot decode lz4 payload: lz4 package is not installed")
+            data = lz4.decompress(data)
+        return self._unwrap(kind, data)
+
+    def stats(self):
+        return {
+            "encoded": self.encoded,
+            "compressed": self.compressed,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "bytes_saved": self.bytes_in - self.bytes_out,
+        }
@@ -0,0 +1,80 @@
+__all__ = ["MISS", "CachedException", "Entry"]
+
+
+class _Miss:
+    """
+    Sentinel returned by cache engines when a key is not found:
+    falsy values (0, "", [], False, None) are valid cache entries
+
+    >>> MISS
+    MISS
+    >>> bool(MISS)
+    False
+    >>> import pickle
+    >>> pickle.loads(pickle.dumps(MISS)) is MISS
+    True
+    """
+    __slots__ = ()
+
+    def __repr__(self):
+        return "MISS"
+
+    def __bool__(self):
+        return False
+
+    def __reduce__(self):
+        return "MISS"
+
+
+MISS = _Miss()
+
+
+class CachedException:
+    """
+    Cache entry wrapping an exception raised by a memoized function (negative caching)
+
+    >>> entry = CachedException(KeyError("user"))
+    >>> entry.reraise()
+    Traceback (most recent call last):
+        ...
+    KeyError: 'user'
+    """
+    __slots__ = ("exception",)
+
+    def __init__(self, exception: BaseException):
+        self.exception = exception
+
+    def __reduce__(self):
+        return CachedException, (self.exception,)
+
+    def reraise(self):
+        raise self.exception
+
+
+class Entry:
+    """
+    Cache entry carrying a soft deadline, after which the value is stale and should be refreshed,
+    and a hard deadline, after which the value must not be served (epoch seconds)
+
+    >>> entry = Entry("value", soft_deadline=10, hard_deadline=20)
+    >>> entry.is_stale(now=15), entry.is_expired(now=15)
+    (True, False)
+    """
+    __slots__ = ("value", "soft_deadline", "hard_deadline")
+
+    def __init__(self, value, soft_deadline: float, hard_deadline: float):
+        self.value = value
+        self.soft_deadline = soft_deadline
+        self.hard_deadline = hard_deadline
+
+    def __reduce__(self):
+        return Entry, (self.value, self.soft_deadline, self.hard_deadline)
+
+    def __repr__(self):
+        return f"Entry(value={self.value!r}, soft_deadline={self.soft_deadline}, hard_deadline={self.hard_deadline})"
+
+    def is_stale(self, now: float) -> bool:
+        return now >= self.soft_deadline
+
+    def is_expired(self, now: float) -> bool:
+        return now >= self.hard_deadline
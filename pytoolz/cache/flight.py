@@ -0,0 +1,184 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Callable
+
+from pytoolz.cache.aio import resolve
+from pytoolz.cache.entries import MISS
+
+__all__ = ["SingleFlight", "AsyncSingleFlight"]
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent computations of the same key: only one caller computes the value,
+    the others wait for it and share its result (or exception), whether it was cached or not.
+    Callers of the same process share a per-key future, callers living in other
+    processes are serialized using a lock held in the cache engine (atomic add, ex. Redis SET NX).
+    If the lock holder does not complete in time (or dies) the waiters compute the value directly.
+
+    Basic Usage:
+    >>> from concurrent.futures import ThreadPoolExecutor
+    >>> store, calls = {}, []
+    >>> def compute():
+    ...     calls.append(1)
+    ...     time.sleep(0.1)
+    ...     store["key"] = 42
+    ...     return 42
+    >>> flight = SingleFlight()
+    >>> with ThreadPoolExecutor(8) as pool:
+    ...     results = list(pool.map(lambda _: flight.do("key", lambda: store.get("key", MISS), compute), range(8)))
+    >>> results == [42] * 8, len(calls)
+    (True, 1)
+
+    Uncached results are shared as well
+    >>> with ThreadPoolExecutor(8) as pool:
+    ...     results = list(pool.map(lambda _: flight.do("other", lambda: MISS, compute), range(8)))
+    >>> results == [42] * 8, len(calls)
+    (True, 2)
+
+    :param cache: engine used to hold the cross process lock, None to coalesce in-process callers only
+    :param timeout: max time in seconds a caller waits for the lock holder
+    :param poll: polling interval in seconds used while waiting a lock held in another process
+    """
+
+    def __init__(self, cache=None, timeout: float = 10, poll: float = 0.05):
+        self.cache = cache
+        self.timeout = timeout
+        self.poll = poll
+        self._calls = {}
+        self._guard = threading.Lock()
+
+    def _remote_do(self, key, lookup: Callable, compute: Callable):
+        lock_key = f"{key}:lock"
+        try:
+            locked = self.cache.add(lock_key, b"1", int(self.timeout) or 1)
+        except NotImplementedError:
+            return compute()
+
+        if locked:
+            try:
+                return compute()
+            finally:
+                self.cache.delete(lock_key)
+
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll)
+            entry = lookup()
+            if entry is not MISS:
+                return entry
+            if self.cache.get(lock_key) is MISS:
+                break
+        return compute()
+
+    def do(self, key, lookup: Callable, compute: Callable):
+        """
+        Return the value of key, computing it once for all the concurrent callers
+        :param key: cache key
+        :param lookup: function returning the cached value or MISS
+        :param compute: function computing and storing the value
+        :return: the value
+        """
+        with self._guard:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+
+        if not leader:
+            try:
+                return call.result(self.timeout)
+            except FutureTimeoutError:
+                return compute()
+
+        try:
+            entry = lookup()
+            if entry is MISS:
+                entry = compute() if self.cache is None else self._remote_do(key, lookup, compute)
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(entry)
+            return entry
+        finally:
+            with self._guard:
+                del self._calls[key]
+
+
+class AsyncSingleFlight:
+    """
+    Asyncio counterpart of SingleFlight: concurrent awaiters of the same key share one in-flight task,
+    across processes the computation is serialized using a lock held in the (sync or async) cache engine.
+
+    Basic Usage:
+    >>> calls = []
+    >>> async def compute():
+    ...     calls.append(1)
+    ...     await asyncio.sleep(0.1)
+    ...     return 42
+    >>> async def lookup():
+    ...     return MISS
+    >>> async def main():
+    ...     flight = AsyncSingleFlight()
+    ...     return await asyncio.gather(*[flight.do("key", lookup, compute) for _ in range(8)])
+    >>> asyncio.run(main()) == [42] * 8, len(calls)
+    (True, 1)
+
+    :param cache: engine used to hold the cross process lock, None to coalesce in-process awaiters only
+    :param timeout: max time in seconds an awaiter waits for the lock holder
+    :param poll: polling interval in seconds used while waiting a lock held in another process
+    """
+
+    def __init__(self, cache=None, timeout: float = 10, poll: float = 0.05):
+        self.cache = cache
+        self.timeout = timeout
+        self.poll = poll
+        self._tasks = {}
+
+    async def _remote_do(self, key, lookup: Callable, compute: Callable):
+        lock_key = f"{key}:lock"
+        try:
+            locked = await resolve(self.cache.add(lock_key, b"1", int(self.timeout) or 1))
+        except NotImplementedError:
+            return await compute()
+
+        if locked:
+            try:
+                return await compute()
+            finally:
+                await resolve(self.cache.delete(lock_key))
+
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll)
+            entry = await lookup()
+            if entry is not MISS:
+                return entry
+            if await resolve(self.cache.get(lock_key)) is MISS:
+                break
+        return await compute()
+
+    async def do(self, key, lookup: Callable, compute: Callable):
+        """
+        Return the value of key, computing it once for all the concurrent awaiters
+        :param key: cache key
+        :param lookup: coroutine function returning the cached value or MISS
+        :param compute: coroutine function computing and storing the value
+        :return: the value
+        """
+        task = self._tasks.get(key)
+        if task is None:
+            if self.cache is None:
+                task = asyncio.ensure_future(compute())
+            else:
+                task = asyncio.ensure_future(self._remote_do(key, lookup, compute))
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), self.timeout)
+        except asyncio.TimeoutError:
+            return await compute()
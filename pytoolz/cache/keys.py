@@ -0,0 +1,160 @@
+import enum
+import hashlib
+import itertools
+import marshal
+import os
+import pickle
+import types
+import weakref
+
+try:
+    from xxhash import xxh3_128_hexdigest as _hexdigest  # faster
+except ImportError:
+    def _hexdigest(data: bytes) -> str:
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+__all__ = ["key_fn", ]
+
+_PRIMITIVES = frozenset((str, int, float, bool, bytes, type(None)))
+# compared by identity but pickled by reference (qualified name): equal in every process
+_BY_REFERENCE = (type, types.FunctionType, types.BuiltinFunctionType, enum.Enum)
+_MAX_PREFIX = 200
+
+_tokens = weakref.WeakKeyDictionary()
+_counter = itertools.count()
+
+
+def _identity(obj) -> str:
+    """
+    Identity of an object in this process: a token never reused while the process lives
+    (id() is, once the object is collected), the id for objects not supporting weak references
+    """
+    try:
+        token = _tokens.get(obj)
+        if token is None:
+            token = _tokens[obj] = next(_counter)
+    except TypeError:
+        token = f"id{id(obj)}"
+    return f"@{os.getpid()}:{token}"
+
+
+def _canonical(obj) -> str:
+    """
+    Canonical (type tagged, order independent for dicts and sets) string encoding of an object.
+    Other objects are encoded by their __cache_key__() method when defined, otherwise objects compared by
+    identity (no __eq__, e.g. self) by their identity and the others (values) by their pickle
+    """
+    cls = type(obj)
+    if cls in _PRIMITIVES:
+        return repr(obj)
+    if cls is tuple or cls is list:
+        return f"{cls.__name__}({','.join(map(_canonical, obj))})"
+    if cls is dict:
+        return f"dict({','.join(sorted(f'{_canonical(k)}:{_canonical(v)}' for k, v in obj.items()))})"
+    if cls is set or cls is frozenset:
+        return f"{cls.__name__}({','.join(sorted(map(_canonical, obj)))})"
+    name = f"{cls.__module__}.{cls.__qualname__}"
+    cache_key = getattr(obj, "__cache_key__", None)
+    if cache_key is not None:
+        return f"{name}:{_canonical(cache_key())}"
+    if cls.__eq__ is object.__eq__ and not isinstance(obj, _BY_REFERENCE):
+        return f"{name}{_identity(obj)}"
+    try:
+        return f"{name}:{pickle.dumps(obj, protocol=4).hex()}"
+    except Exception:  # equal values can't be told apart: fall back to the identity
+        return f"{name}{_identity(obj)}"
+
+
+def key_fn(func, args, kwargs, version=None):
+    """
+    Compose cache key using function module/qualified name, version and a fixed length digest
+    (xxh3 128 bit if xxhash is installed, blake2b 128 bit otherwise) of a canonical encoding of args and kwargs.
+    Keys are collision safe (no string munging), kwargs aware and always shorter than 250 bytes (Memcached limit).
+    Primitive arguments (str, int, float, bool, bytes, None) take a fast path, containers are encoded
+    element by element, other objects:
+    - by the (canonical encoding of the) value returned by their __cache_key__() method if defined
+    - by their identity when compared by identity (classes without __eq__, e.g. self of methods): the keys
+      are not shared with other instances nor with other processes
+    - by their pickle otherwise (values: dataclasses, datetime, Decimal...)
+
+    Basic Usage:
+    >>> def fn(a, b=1):
+    ...     pass
+    >>> key_fn(fn, (1,), {}).startswith("pytoolz.cache.keys.fn::")
+    True
+    >>> key_fn(fn, ("a b",), {}) == key_fn(fn, ("ab",), {})
+    False
+    >>> key_fn(fn, (1,), {"b": 2}) == key_fn(fn, (1,), {"b": 3})
+    False
+    >>> key_fn(fn, ({"x": 1, "y": 2},), {}) == key_fn(fn, ({"y": 2, "x": 1},), {})
+    True
+    >>> len(key_fn(fn, ("x" * 1000,), {})) < 250
+    True
+
+    Use a version namespace to invalidate the keys on deploy
+    >>> from functools import partial
+    >>> key_fn(fn, (1,), {}) == partial(key_fn, version="v2")(fn, (1,), {})
+    False
+
+    Objects define their key with __cache_key__, the others compared by identity are keyed by identity
+    >>> class User:
+    ...     def __init__(self, id):
+    ...         self.id = id
+    ...     def __cache_key__(self):
+    ...         return self.id
+    >>> key_fn(fn, (User(1),), {}) == key_fn(fn, (User(1),), {})
+    True
+    >>> service = object()
+    >>> key = key_fn(fn, (service,), {})
+    >>> key == key_fn(fn, (service,), {}), key == key_fn(fn, (object(),), {})
+    (True, False)
+
+    :param func: function
+    :param args: function args
+    :param kwargs: function kwargs
+    :param version: optional namespace included in the key
+    :return: cache key string
+    """
+    if _PRIMITIVES.issuperset(map(type, args)) and (not kwargs or _PRIMITIVES.issuperset(map(type, kwargs.values()))):
+        # marshal version 2 has no back references: equal values always produce the same bytes
+        encoded = b"m" + marshal.dumps((args, tuple(sorted(kwargs.items()))) if kwargs else args, 2)
+    else:
+        encoded = b"c" + f"{_canonical(args)}{_canonical(kwargs)}".encode()
+
+    prefix = f"{func.__module__}.{func.__qualname__}"
+    if len(prefix) > _MAX_PREFIX:
+        prefix = _hexdigest(prefix.encode())
+
+    return f"{prefix}:{version or ''}:{_hexdigest(encoded)}"
+
+
+if __name__ == "__main__":
+    import timeit
+
+
+    def legacy_key_fn(func, args, kwargs):
+        keyparts = (f"{func.__name__},PARAMS", ",".join([str(x) for x in args]))
+        return "||".join(keyparts).replace(' ', '')
+
+
+    def fn(*args, **kwargs):
+        pass
+
+
+    class Service:
+        def __init__(self):
+            self.index = {index: str(index) for index in range(100000)}
+
+
+    cases = {
+        "primitives": ((1, 2.5, "user name", None), {}),
+        "kwargs": ((1,), {"limit": 10, "offset": 20}),
+        "long string": (("x" * 10000,), {}),
+        "containers": (([1, 2, 3], {"a": 1, "b": [1, 2]}), {}),
+        "self": ((Service(),), {}),
+    }
+    number = 100000
+    for name, (args, kwargs) in cases.items():
+        legacy = timeit.timeit(lambda: legacy_key_fn(fn, args, kwargs), number=number)
+        current = timeit.timeit(lambda: key_fn(fn, args, kwargs), number=number)
+        print(f"{name:<12} legacy: {legacy / number * 1e6:6.2f}us  key_fn: {current / number * 1e6:6.2f}us")
@@ -1,54 +1,237 @@
 import abc
+import asyncio
 import functools
+import itertools
+import logging
 import os
-
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Callable
 
-__all__ = ["CacheEngine", "key_fn", "memoize"]
+from pytoolz.cache.aio import resolve
+from pytoolz.cache.codec import Codec
+from pytoolz.cache.entries import MISS, CachedException, Entry
+from pytoolz.cache.flight import SingleFlight, AsyncSingleFlight
+from pytoolz.cache.keys import key_fn
+
+__all__ = ["CacheEngine", "MemcachedEngine", "RedisEngine", "InMemoryEngine", "FileEngine", "memoize", "memoize_batch"]
 
+logger = logging.getLogger(__name__)
 
+_SWEEP_INTERVAL = 128  # InMemoryEngine segments look for expired entries every _SWEEP_INTERVAL sets
+_SWEEP_SIZE = 64  # number of least recently used entries checked by a periodic sweep
 
 
 class CacheEngine(metaclass=abc.ABCMeta):
     """
-    Interface used to define Cache backends
+    Interface used to define Cache backends.
+    get returns the MISS sentinel when the key is not found, so that falsy values are valid entries.
+    Backends storing bytes use a Codec to serialize (and compress) values
     """
+    codec = None
+
+    def _encode(self, value):
+        return value if self.codec is None else self.codec.encode(value)
+
+    def _decode(self, data):
+        return data if self.codec is None else self.codec.decode(data)
 
     @abc.abstractmethod
     def get(self, key):
+        """
+        :return: the cached value or MISS
+        """
         pass
 
     @abc.abstractmethod
     def set(self, key, value, expiry):
         pass
 
+    def add(self, key, value, expiry) -> bool:
+        """
+        Atomically set the key only if it does not exist, return True if the value has been stored.
+        Used to hold locks inside the engine (single-flight across processes)
+        """
+        raise NotImplementedError(f"{self.__class__.__name__} does not support atomic add")
+
+    def delete(self, key):
+        raise NotImplementedError(f"{self.__class__.__name__} does not support delete")
+
+    def get_many(self, keys) -> dict:
+        """
+        Bulk get, backends should override it using a single round trip
+        :param keys: iterable of keys
+        :return: dict containing the found keys only
+        """
+        entries = {}
+        for key in keys:
+            entry = self.get(key)
+            if entry is not MISS:
+                entries[key] = entry
+        return entries
+
+    def set_many(self, mapping: dict, expiry):
+        for key, value in mapping.items():
+            self.set(key, value, expiry)
+
+    def delete_many(self, keys):
+        for key in keys:
+            self.delete(key)
+
 
 class MemcachedEngine(CacheEngine):
-    def __init__(self, host: str = "localhost", port: int = 11211):
+    def __init__(self, host: str = "localhost", port: int = 11211, codec: Codec = None):
         from pymemcache.client import base
         self._client = base.Client((host, port))
+        self.codec = codec or Codec()
 
     def get(self, key):
-        return self._client.get(key)
+        entry = self._client.get(key)
+        return MISS if entry is None else self._decode(entry)
 
     def set(self, key, value, expiry):
-        self._client.set(key, value, expiry)
+        self._client.set(key, self._encode(value), expiry or 0)
+
+    def add(self, key, value, expiry):
+        return self._client.add(key, self._encode(value), expiry or 0, noreply=False)
+
+    def delete(self, key):
+        self._client.delete(key)
+
+    def get_many(self, keys):
+        return {key: self._decode(entry) for key, entry in self._client.get_many(keys).items()}
+
+    def set_many(self, mapping, expiry):
+        self._client.set_many({key: self._encode(value) for key, value in mapping.items()}, expiry or 0)
+
+    def delete_many(self, keys):
+        self._client.delete_many(keys)
 
 
 class RedisEngine(CacheEngine):
-    def __init__(self, host: str = "localhost", port: int = 6379):
+    def __init__(self, host: str = "localhost", port: int = 6379, codec: Codec = None):
         import redis
         self._client = redis.Redis(host=host, port=port)
+        self.codec = codec or Codec()
 
     def get(self, key):
-        return self._client.get(key)
+        entry = self._client.get(key)
+        return MISS if entry is None else self._decode(entry)
 
     def set(self, key, value, expiry):
-        self._client.set(key, value, ex=expiry, )
+        self._client.set(key, self._encode(value), ex=expiry, )
+
+    def add(self, key, value, expiry):
+        return bool(self._client.set(key, self._encode(value), ex=expiry, nx=True))
+
+    def delete(self, key):
+        self._client.delete(key)
+
+    def get_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        return {key: self._decode(entry) for key, entry in zip(keys, self._client.mget(keys)) if entry is not None}
+
+    def set_many(self, mapping, expiry):
+        pipeline = self._client.pipeline(transaction=False)
+        for key, value in mapping.items():
+            pipeline.set(key, self._encode(value), ex=expiry)
+        pipeline.execute()
+
+    def delete_many(self, keys):
+        keys = list(keys)
+        if keys:
+            self._client.delete(*keys)
+
+
+class _Segment:
+    """
+    LRU segment of InMemoryEngine: OrderedDict of key -> (value, expires_at, size) guarded by its own lock
+    """
+    __slots__ = ("limit", "max_bytes", "size", "sets", "evictions", "_data", "_lock")
+
+    def __init__(self, limit: int, max_bytes: int = None):
+        self.limit = limit
+        self.max_bytes = max_bytes
+        self.size = self.sets = self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return MISS
+            if entry[1] is not None and entry[1] <= time.monotonic():
+                del self._data[key]
+                self.size -= entry[2]
+                return MISS
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, expires_at, size):
+        with self._lock:
+            self._set(key, value, expires_at, size)
+
+    def add(self, key, value, expires_at, size):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+                return False
+            self._set(key, value, expires_at, size)
+            return True
+
+    def _set(self, key, value, expires_at, size):
+        """
+        Store the entry and evict the least recently used ones over the limits (the lock must be held)
+        """
+        previous = self._data.pop(key, None)
+        if previous is not None:
+            self.size -= previous[2]
+        self._data[key] = (value, expires_at, size)
+        self.size += size
+        while len(self._data) > self.limit or (self.max_bytes and self.size > self.max_bytes):
+            self.size -= self._data.popitem(last=False)[1][2]
+            self.evictions += 1
+
+        self.sets += 1
+        if self.sets % _SWEEP_INTERVAL == 0:
+            self._sweep(_SWEEP_SIZE)
+
+    def delete(self, key):
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self.size -= previous[2]
+
+    def _sweep(self, count=None):
+        """
+        Remove the expired entries among the count least recently used ones (all the entries if count is None)
+        """
+        now = time.monotonic()
+        expired = [key for key, (_, expires_at, _) in itertools.islice(self._data.items(), count)
+                   if expires_at is not None and expires_at <= now]
+        for key in expired:
+            self.size -= self._data.pop(key)[2]
+
+    def purge(self):
+        with self._lock:
+            self._sweep()
+
+    def __len__(self):
+        return len(self._data)
 
 
 class InMemoryEngine(CacheEngine):
     """
+    Thread safe in-process LRU engine: O(1) get/set on OrderedDict segments, per-entry expiry
+    (expired entries are dropped lazily on get and periodically on set), optional bound in bytes.
+    Keys are spread over `stripes` independently locked segments to reduce lock contention between threads.
+
     >>> engine = InMemoryEngine(2)
     >>> engine.set("a", 1)
     >>> engine.set("b", 2)
@@ -57,29 +240,98 @@ class InMemoryEngine(CacheEngine):
     >>> engine.get("a")
     1
     >>> engine.get("c")
+    MISS
+
+    Least recently used entries are evicted first
+    >>> engine.set("c", 3)
+    >>> engine.get("b")
+    MISS
+    >>> len(engine)
+    2
+
+    Per-entry expiry
+    >>> engine.set("d", 4, expiry=0.05)
+    >>> time.sleep(0.1)
+    >>> engine.get("d")
+    MISS
+
+    :param limit: max number of entries
+    :param expiration: default expiry in seconds of the entries, 0 means no expiry
+    :param max_bytes: max size in bytes of the stored values (estimated using sizeof), None means unbounded
+    :param stripes: number of segments (each one bounded by limit / stripes entries)
+    :param sizeof: function used to estimate the size of a value
+    :param codec: optional codec used to store values as bytes
     """
 
-    def __init__(self, limit: int, expiration: int = 0):
-        from lru import LRUCacheDict
-        self._client = LRUCacheDict(max_size=limit, expiration=expiration)
+    def __init__(self, limit: int, expiration: int = 0, max_bytes: int = None, stripes: int = 1,
+                 sizeof: Callable = sys.getsizeof, codec: Codec = None):
+        segment_limit = max(1, -(-limit // stripes))
+        segment_bytes = -(-max_bytes // stripes) if max_bytes else None
+        self._segments = tuple(_Segment(segment_limit, segment_bytes) for _ in range(stripes))
+        self._stripes = stripes
+        self.expiration = expiration
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self.codec = codec
+
+    def _segment(self, key) -> _Segment:
+        if self._stripes == 1:
+            return self._segments[0]
+        return self._segments[hash(key) % self._stripes]
+
+    def _expires_at(self, expiry):
+        expiry = expiry or self.expiration
+        return time.monotonic() + expiry if expiry else None
 
     def get(self, key):
-        try:
-            return self._client[key]
-        except KeyError:
-            return None
+        entry = self._segment(key).get(key)
+        return entry if entry is MISS else self._decode(entry)
 
     def set(self, key, value, expiry=None):
-        if expiry:
-            raise ValueError(
-                f"Expiration should not be defined while setting single value using {self.__class__}, "
-                f"Please pass expiration parameter in the object creation")
-        self._client[key] = value
+        value = self._encode(value)
+        size = self._sizeof(value) if self.max_bytes else 0
+        segment = self._segment(key)
+        if segment.max_bytes and size > segment.max_bytes:
+            segment.delete(key)
+            return
+        segment.set(key, value, self._expires_at(expiry), size)
+
+    def add(self, key, value, expiry=None):
+        value = self._encode(value)
+        size = self._sizeof(value) if self.max_bytes else 0
+        segment = self._segment(key)
+        if segment.max_bytes and size > segment.max_bytes:
+            return False
+        return segment.add(key, value, self._expires_at(expiry), size)
+
+    def delete(self, key):
+        self._segment(key).delete(key)
+
+    def purge(self):
+        """
+        Remove all the expired entries
+        """
+        for segment in self._segments:
+            segment.purge()
+
+    @property
+    def size(self):
+        """
+        Estimated size in bytes of the stored values (tracked only when max_bytes is defined)
+        """
+        return sum(segment.size for segment in self._segments)
+
+    @property
+    def evictions(self):
+        return sum(segment.evictions for segment in self._segments)
+
+    def __len__(self):
+        return sum(len(segment) for segment in self._segments)
 
 
 class FileEngine(CacheEngine):
 
-    def __init__(self, path='/tmp', tag=None):
+    def __init__(self, path='/tmp', tag=None, codec: Codec = None):
         if not all([
             os.path.exists(path),
             os.path.isdir(path)
@@ -89,63 +341,342 @@ class FileEngine(CacheEngine):
         import diskcache as dc
         self.client = dc.Cache(directory=path)
         self.tag = tag
+        self.codec = codec
 
     def get(self, key):
-        return self.client.get(key, tag=self.tag)
+        entry = self.client.get(key, MISS)
+        return entry if entry is MISS else self._decode(entry)
 
     def set(self, key, value, expiry):
-        self.client.set(key, value, expiry, tag=self.tag)
+        self.client.set(key, self._encode(value), expiry, tag=self.tag)
 
+    def add(self, key, value, expiry):
+        return self.client.add(key, self._encode(value), expiry, tag=self.tag)
 
-def key_fn(func, args, kwargs):
-    """
-    Compose cache key using function name and function input parameters
-    :param func: function
-    :param args: function args
-    :param kwargs: function kwargs
-    :return: cache key string
-    """
-    group_sep = "||"
-    args_sep = ","
+    def delete(self, key):
+        self.client.delete(key)
+
+    def get_many(self, keys):
+        entries = {}
+        with self.client.transact():
+            for key in keys:
+                entry = self.client.get(key, MISS)
+                if entry is not MISS:
+                    entries[key] = self._decode(entry)
+        return entries
 
-    keyparts = (
-        f"{func.__name__},"
-        f"PARAMS",
-        f"{args_sep.join([str(x) for x in args])}"
-    )
-    key = f"{group_sep}".join(keyparts).replace(' ', '')
+    def set_many(self, mapping, expiry):
+        with self.client.transact():
+            for key, value in mapping.items():
+                self.client.set(key, self._encode(value), expiry, tag=self.tag)
 
-    return key
+    def delete_many(self, keys):
+        with self.client.transact():
+            for key in keys:
+                self.client.delete(key)
 
 
-def memoize(cache: CacheEngine, key_func: Callable = key_fn, expiry: int = None):
+@functools.lru_cache(maxsize=None)
+def _refresh_executor():
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="memoize-refresh")
+
+
+def memoize(cache: CacheEngine, key_func: Callable = key_fn, expiry: int = None,
+            single_flight: bool = False, distributed_lock: bool = False, lock_timeout: float = 10,
+            cache_none: bool = False, cache_exceptions: tuple = (), negative_expiry: int = None,
+            stale_ttl: int = None, refresh_ahead: float = None, version: str = None):
     """
     Cache Decorator used to store decorated function result.
-    It produces side effect calling get/set method of the cache engine
+    It produces side effect calling get/set method of the cache engine.
+    Falsy results (0, "", [], False) are cached, None results and exceptions are cached only if requested
+    (negative caching), using their own expiry
 
     Basic Usage:
-    >>> @memoize(InMemoryEngine, expiry=10):
+    >>> calls = []
+    >>> @memoize(InMemoryEngine(limit=10))
     ... def square(number):
+    ...     calls.append(number)
+    ...     return number **2
+    >>> square(0), square(0), calls
+    (0, 0, [0])
+
+    Single flight: on a miss only one concurrent caller computes the value, the others wait for its result
+    >>> @memoize(RedisEngine(), expiry=10, single_flight=True, distributed_lock=True)
+    ... def expensive(number):
     ...     return number **2
 
+    Negative caching: cache missing entities and lookup errors for a shorter time
+    >>> @memoize(RedisEngine(), expiry=3600, cache_none=True, cache_exceptions=(KeyError,), negative_expiry=30)
+    ... def find_user(user_id):
+    ...     return None
+
+    Stale while revalidate: after expiry the stale value is served for stale_ttl more seconds while
+    a background refresh recomputes it, refresh_ahead recomputes hot keys shortly before they expire
+    >>> @memoize(InMemoryEngine(limit=10), expiry=60, stale_ttl=600, refresh_ahead=5)
+    ... def report(day):
+    ...     return day
+
+    With distributed_lock a refresh running in another process (holding the refresh lock) is not duplicated,
+    the next stale reads retry it
+    >>> engine, calls = InMemoryEngine(limit=10), []
+    >>> @memoize(engine, expiry=0.05, stale_ttl=60, distributed_lock=True)
+    ... def visits(page):
+    ...     calls.append(page)
+    ...     return len(calls)
+    >>> visits("home")
+    1
+    >>> lock_key = key_fn(visits, ("home",), {}) + ":refresh"
+    >>> engine.set(lock_key, b"1", 60)  # held by another process
+    >>> time.sleep(0.1)
+    >>> visits("home"), time.sleep(0.1), len(calls)
+    (1, None, 1)
+    >>> engine.delete(lock_key)
+    >>> visits("home"), time.sleep(0.1), visits("home")
+    (1, None, 2)
+
+    Version namespace: results cached by a previous version of the function are not served
+    >>> @memoize(RedisEngine(), expiry=3600, version="v2")
+    ... def price(item):
+    ...     return 0
+
+    Coroutine functions are awaited, concurrent awaiters of the same key share one result,
+    the engine can be either a CacheEngine or an AsyncCacheEngine
+    >>> from pytoolz.cache.aio import AsyncInMemoryEngine
+    >>> @memoize(AsyncInMemoryEngine(limit=10))
+    ... async def cube(number):
+    ...     return number ** 3
+    >>> asyncio.run(cube(3))
+    27
+
     :param cache: cache engine : implementation of CacheEngine interface
     :param key_func: function used to calculate the cache key using input fn parameters
-    :param expiry: expiry time in seconds
+    :param expiry: expiry time in seconds (soft expiry when stale_ttl is defined)
+    :param single_flight: coalesce concurrent computations of the same key (threads of the same process),
+        always enabled for coroutine functions
+    :param distributed_lock: coalesce computations (and refreshes) across processes using a lock held
+        in the cache engine
+    :param lock_timeout: max time in seconds waiting for the computation of another caller
+    :param cache_none: cache None results
+    :param cache_exceptions: exception types raised by the function that are cached (and raised on hit)
+    :param negative_expiry: expiry time in seconds of None results and exceptions, defaults to expiry
+    :param stale_ttl: time in seconds a value is served (and refreshed in background) after its expiry
+    :param refresh_ahead: time in seconds before the expiry when a hit triggers a background refresh
+    :param version: namespace passed to key_func, change it to invalidate the cached results (e.g. on deploy)
     :return:
     """
+    if version is not None:
+        key_func = functools.partial(key_func, version=version)
+    if negative_expiry is None:
+        negative_expiry = expiry
+    revalidate = stale_ttl is not None or refresh_ahead is not None
+    if revalidate and not (expiry and negative_expiry):
+        raise ValueError("stale_ttl and refresh_ahead require an expiry")
+
+    def unwrap(entry):
+        if type(entry) is CachedException:
+            entry.reraise()
+        return entry
+
+    def entry_of(value, entry_expiry):
+        """
+        Return the cache entry of a value and its expiry in the engine
+        """
+        if not revalidate:
+            return value, entry_expiry
+        now = time.time()
+        hard_expiry = entry_expiry + (stale_ttl or 0)
+        return Entry(value, now + entry_expiry, now + hard_expiry), hard_expiry
+
+    def result_entry(value):
+        if value is None:
+            return entry_of(None, negative_expiry) if cache_none else (MISS, None)
+        return entry_of(value, expiry)
+
+    def read(entry):
+        """
+        Return the value stored in a cache entry (MISS if expired) and whether it has to be refreshed
+        """
+        if type(entry) is not Entry:
+            return entry, False
+        now = time.time()
+        if entry.is_expired(now):
+            return MISS, False
+        return entry.value, now >= entry.soft_deadline - (refresh_ahead or 0)
+
+    def async_decorator(func):
+        flight = AsyncSingleFlight(cache if distributed_lock else None, timeout=lock_timeout)
+        refreshing = {}
+
+        async def lookup(key):
+            return read(await resolve(cache.get(key)))[0]
+
+        async def compute(key, args, kwargs):
+            try:
+                value = await func(*args, **kwargs)
+            except cache_exceptions as e:
+                await resolve(cache.set(key, *entry_of(CachedException(e), negative_expiry)))
+                raise
+            entry, entry_expiry = result_entry(value)
+            if entry is not MISS:
+                await resolve(cache.set(key, entry, entry_expiry))
+            return value
+
+        async def refresh(key, args, kwargs):
+            lock_key, locked = f"{key}:refresh", False
+            try:
+                if distributed_lock:
+                    try:
+                        locked = bool(await resolve(cache.add(lock_key, b"1", int(lock_timeout) or 1)))
+                    except NotImplementedError:
+                        locked = None  # no atomic add: refresh without the lock
+                    if locked is False:  # refreshed by another process
+                        return
+                await compute(key, args, kwargs)
+            except Exception:
+                logger.exception(f"Background refresh of {key} failed")
+            finally:
+                refreshing.pop(key, None)
+                if locked:
+                    await resolve(cache.delete(lock_key))
+
+        @functools.wraps(func)
+        async def _inner(*args, **kwargs):
+            key = str(key_func(func, args, kwargs))
+            value, stale = read(await resolve(cache.get(key)))
+
+            if value is not MISS:
+                if stale and key not in refreshing:
+                    refreshing[key] = asyncio.ensure_future(refresh(key, args, kwargs))
+                return unwrap(value)
+
+            return unwrap(await flight.do(key, functools.partial(lookup, key),
+                                          functools.partial(compute, key, args, kwargs)))
+
+        return _inner
 
     def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            return async_decorator(func)
+
+        flight = None
+        if single_flight:
+            flight = SingleFlight(cache if distributed_lock else None, timeout=lock_timeout)
+        refreshing = set()
+        refreshing_lock = threading.Lock()
+
+        def lookup(key):
+            return read(cache.get(key))[0]
+
+        def compute(key, args, kwargs):
+            try:
+                value = func(*args, **kwargs)
+            except cache_exceptions as e:
+                cache.set(key, *entry_of(CachedException(e), negative_expiry))
+                raise
+            entry, entry_expiry = result_entry(value)
+            if entry is not MISS:
+                cache.set(key, entry, entry_expiry)
+            return value
+
+        def refresh(key, args, kwargs):
+            lock_key, locked = f"{key}:refresh", False
+            try:
+                if distributed_lock:
+                    try:
+                        locked = bool(cache.add(lock_key, b"1", int(lock_timeout) or 1))
+                    except NotImplementedError:
+                        locked = None  # no atomic add: refresh without the lock
+                    if locked is False:  # refreshed by another process
+                        return
+                compute(key, args, kwargs)
+            except Exception:
+                logger.exception(f"Background refresh of {key} failed")
+            finally:
+                with refreshing_lock:
+                    refreshing.discard(key)
+                if locked:
+                    cache.delete(lock_key)
+
         @functools.wraps(func)
         def _inner(*args, **kwargs):
             key = str(key_func(func, args, kwargs))
-            entry = cache.get(key)
+            value, stale = read(cache.get(key))
+
+            if value is not MISS:
+                if stale:
+                    with refreshing_lock:
+                        start = key not in refreshing
+                        refreshing.add(key)
+                    if start:
+                        _refresh_executor().submit(refresh, key, args, kwargs)
+                return unwrap(value)
+
+            if flight is None:
+                return compute(key, args, kwargs)
+            return unwrap(flight.do(key, functools.partial(lookup, key),
+                                    functools.partial(compute, key, args, kwargs)))
 
-            if entry:
-                return entry
-            else:
-                entry = func(*args, **kwargs)
-                cache.set(key, entry, expiry=expiry)
-                return entry
+        return _inner
+
+    return decorator
+
+
+def memoize_batch(cache: CacheEngine, key_func: Callable = key_fn, expiry: int = None, version: str = None):
+    """
+    Cache Decorator for bulk functions: the decorated function receives a list of items and returns
+    the list of the results (same order). All the keys are looked up with a single get_many call,
+    only the misses are computed (with a single call of the decorated function) and written back using set_many
+
+    Basic Usage:
+    >>> calls = []
+    >>> @memoize_batch(InMemoryEngine(limit=10))
+    ... def squares(numbers):
+    ...     calls.append(numbers)
+    ...     return [number ** 2 for number in numbers]
+    >>> squares([1, 2, 3])
+    [1, 4, 9]
+    >>> squares([2, 3, 4, 4])
+    [4, 9, 16, 16]
+    >>> calls
+    [[1, 2, 3], [4]]
+    >>> @memoize_batch(InMemoryEngine(limit=10))
+    ... def broken(numbers):
+    ...     return numbers[:1]
+    >>> broken([1, 2])
+    Traceback (most recent call last):
+    ...
+    ValueError: broken returned 1 results, expected one per item: 2
+
+    :param cache: cache engine : implementation of CacheEngine interface
+    :param key_func: function used to calculate the cache key of every item
+    :param expiry: expiry time in seconds
+    :param version: namespace passed to key_func, change it to invalidate the cached results
+    :return:
+    """
+    if version is not None:
+        key_func = functools.partial(key_func, version=version)
+
+    def decorator(func):
+        @functools.wraps(func)
+        def _inner(items, *args, **kwargs):
+            items = list(items)
+            keys = [str(key_func(func, (item,) + args, kwargs)) for item in items]
+            entries = cache.get_many(keys)
+
+            missing = {}
+            for key, item in zip(keys, items):
+                if key not in entries:
+                    missing.setdefault(key, item)
+
+            if missing:
+                results = list(func(list(missing.values()), *args, **kwargs))
+                if len(results) != len(missing):
+                    raise ValueError(f"{func.__qualname__} returned {len(results)} results, expected one per item: {len(missing)}")
+                computed = dict(zip(missing, results))
+                cache.set_many(computed, expiry=expiry)
+                entries.update(computed)
+
+            return [entries[key] for key in keys]
 
         return _inner
 
@@ -153,15 +684,50 @@ def memoize(cache: CacheEngine, key_func: Callable = key_fn, expiry: int = None)
 
 
 if __name__ == "__main__":
-    file_engine = FileEngine(tag="dam")
+    import timeit
+
+    number = 200000
+    keys = [f"key-{i}" for i in range(1000)]
+
+    engines = {
+        "InMemoryEngine": InMemoryEngine(limit=500),
+        "InMemoryEngine(stripes=8)": InMemoryEngine(limit=500, stripes=8),
+    }
+    try:
+        from lru import LRUCacheDict
+
+        class LRUCacheDictEngine(CacheEngine):
+            def __init__(self, limit):
+                self._client = LRUCacheDict(max_size=limit, expiration=2 ** 32)
+
+            def get(self, key):
+                try:
+                    return self._client[key]
+                except KeyError:
+                    return MISS
+
+            def set(self, key, value, expiry=None):
+                self._client[key] = value
+
+        engines["py_lru_cache LRUCacheDict"] = LRUCacheDictEngine(500)
+    except ImportError:
+        pass
 
+    for name, engine in engines.items():
+        keys_iter = itertools.cycle(keys)
+        set_time = timeit.timeit(lambda: engine.set(next(keys_iter), 1), number=number)
+        get_time = timeit.timeit(lambda: engine.get(next(keys_iter)), number=number)
+        print(f"{name:<28} set: {number / set_time:>10,.0f} ops/s  get: {number / get_time:>10,.0f} ops/s")
 
-    @memoize(InMemoryEngine(limit=10, expiration=10))
-    def fn(*args):
-        return args
+    @functools.lru_cache(maxsize=500)
+    def lru_cached(x):
+        return x
 
+    @memoize(InMemoryEngine(limit=500))
+    def memoized(x):
+        return x
 
-    fn(1, 2, 3, 4, 5)
-    fn(1, 2, 3, 4, 5)
-    fn(1, 2, 3, 4, 5)
-    fn(1, 2, 3, 4, 5)
+    for name, fn in (("functools.lru_cache", lru_cached), ("memoize(InMemoryEngine)", memoized)):
+        fn(1)
+        hit_time = timeit.timeit(lambda: fn(1), number=number)
+        print(f"{name:<28} hit: {number / hit_time:>10,.0f} ops/s")
@@ -0,0 +1,422 @@
+import bisect
+import inspect
+import logging
+import time
+from typing import Callable
+
+from pytoolz.cache.entries import MISS
+from pytoolz.cache.memoize import CacheEngine
+
+__all__ = ["ENGINE_LABEL", "LatencyHistogram", "CacheMetrics", "InstrumentedEngine", "LogSink", "PrometheusSink",
+           "to_prometheus"]
+
+# upper bounds in seconds of the latency buckets (the last bucket is unbounded)
+BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+           0.25, 0.5, 1, 2.5, 5, 10)
+
+_COUNTERS = ("hits", "misses", "sets", "adds", "deletes", "errors")
+# metrics group of the counters kept by the wrapped engine for all the keys
+ENGINE_LABEL = "*"
+_ENGINE_COUNTERS = ("evictions",)
+
+
+def function_label(key) -> str:
+    """
+    Label of a cache key generated by key_fn: the module/qualified name of the memoized function,
+    "other" for the keys without prefix (bounded number of labels)
+
+    >>> function_label("app.fn:v2:0f1e"), function_label("session-42")
+    ('app.fn', 'other')
+    """
+    prefix, separator, _ = str(key).partition(":")
+    return prefix if separator else "other"
+
+
+class LatencyHistogram:
+    """
+    Fixed buckets latency histogram (Prometheus style), O(log buckets) observe
+
+    >>> histogram = LatencyHistogram()
+    >>> for latency in (0.001, 0.002, 0.003, 0.2):
+    ...     histogram.observe(latency)
+    >>> histogram.count, round(histogram.total, 3)
+    (4, 0.206)
+    >>> histogram.percentile(0.5)
+    0.0025
+
+    :param buckets: sorted upper bounds in seconds of the buckets
+    """
+    __slots__ = ("buckets", "counts", "count", "total")
+
+    def __init__(self, buckets: tuple = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def percentile(self, q: float) -> float:
+        """
+        Upper bound of the bucket containing the q-th percentile (inf if it falls in the last bucket)
+        """
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen and seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "buckets": dict(zip(self.buckets + (float("inf"),), self.counts)),
+        }
+
+
+class CacheMetrics:
+    """
+    Counters and get/set latency histograms of a group of cache keys.
+    Counters are updated without locks: under heavy thread contention they are approximate
+    """
+    __slots__ = _COUNTERS + ("get_latency", "set_latency")
+
+    def __init__(self, buckets: tuple = BUCKETS):
+        for counter in _COUNTERS:
+            setattr(self, counter, 0)
+        self.get_latency = LatencyHistogram(buckets)
+        self.set_latency = LatencyHistogram(buckets)
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def snapshot(self) -> dict:
+        stats = {counter: getattr(self, counter) for counter in _COUNTERS}
+        stats["hit_ratio"] = self.hit_ratio
+        stats["get_latency"] = self.get_latency.snapshot()
+        stats["set_latency"] = self.set_latency.snapshot()
+        return stats
+
+
+class InstrumentedEngine(CacheEngine):
+    """
+    Cache engine wrapper recording hits, misses, writes, errors and get/set latency of any engine
+    (CacheEngine or AsyncCacheEngine), grouped by memoized function (the key prefix generated by key_fn).
+    Snapshots are pushed to the sinks every report_interval seconds (checked on writes) or calling report()
+
+    Basic Usage:
+    >>> from pytoolz.cache import memoize, InMemoryEngine
+    >>> engine = InstrumentedEngine(InMemoryEngine(limit=10))
+    >>> @memoize(engine)
+    ... def square(number):
+    ...     return number ** 2
+    >>> square(2), square(2), square(3)
+    (4, 4, 9)
+    >>> stats = engine.stats()["pytoolz.cache.metrics.square"]
+    >>> stats["hits"], stats["misses"], stats["sets"], stats["get_latency"]["count"]
+    (1, 2, 2, 3)
+
+    Batch operations are counted by label of every key
+    >>> engine.get_many(["app.a:1", "app.b:1", "app.b:2"]) == {}
+    True
+    >>> engine.stats()["app.a"]["misses"], engine.stats()["app.b"]["misses"]
+    (1, 2)
+
+    Push the metrics to a callback, a logger or a Prometheus exporter
+    >>> reports, logged = [], []
+    >>> engine = InstrumentedEngine(InMemoryEngine(limit=10),
+    ...                             sinks=[reports.append, LogSink(lambda label, metrics: logged.append(label))])
+    >>> engine.get("key")
+    MISS
+    >>> engine.report()
+    >>> reports[0]["other"]["misses"], logged
+    (1, ['other', '*'])
+
+    Counters kept by the wrapped engine for all the keys (evictions) are reported in the ENGINE_LABEL group
+    >>> engine = InstrumentedEngine(InMemoryEngine(limit=1))
+    >>> engine.set("a", 1); engine.set("b", 2)
+    >>> engine.stats()[ENGINE_LABEL]
+    {'evictions': 1}
+
+    :param engine: instrumented cache engine
+    :param sinks: callables receiving the stats() snapshot (LogSink, PrometheusSink, any callback)
+    :param report_interval: push the snapshot to the sinks every report_interval seconds, None to report manually
+    :param label: function returning the metrics group of a key, by default the memoized function name
+    :param buckets: upper bounds in seconds of the latency histogram buckets
+    """
+
+    def __init__(self, engine, sinks: list = (), report_interval: float = None,
+                 label: Callable = function_label, buckets: tuple = BUCKETS):
+        self.engine = engine
+        self.sinks = list(sinks)
+        self.report_interval = report_interval
+        self._label = label
+        self._buckets = buckets
+        self._metrics = {}
+        self._reported_at = time.monotonic()
+        self._async = inspect.iscoroutinefunction(engine.get)
+
+    def metrics(self, key) -> CacheMetrics:
+        label = self._label(key)
+        metrics = self._metrics.get(label)
+        if metrics is None:
+            metrics = self._metrics.setdefault(label, CacheMetrics(self._buckets))
+        return metrics
+
+    def _groups(self, keys) -> dict:
+        """
+        Keys grouped by metrics (label)
+        """
+        groups = {}
+        for key in keys:
+            groups.setdefault(self.metrics(key), []).append(key)
+        return groups
+
+    def _call(self, method, groups: dict, args, record):
+        """
+        Call an engine method, timing it and counting its errors, record(metrics, keys, result, elapsed)
+        updates the metrics of every group of keys once the result is available (awaiting it for async engines)
+        """
+        start = time.perf_counter()
+        try:
+            result = method(*args)
+        except NotImplementedError:
+            raise
+        except Exception:
+            for metrics in groups:
+                metrics.errors += 1
+            raise
+        if self._async:
+            return self._await(groups, result, start, record)
+        elapsed = time.perf_counter() - start
+        for metrics, keys in groups.items():
+            record(metrics, keys, result, elapsed)
+        return result
+
+    async def _await(self, groups: dict, result, start, record):
+        try:
+            result = await result
+        except Exception:
+            for metrics in groups:
+                metrics.errors += 1
+            raise
+        elapsed = time.perf_counter() - start
+        for metrics, keys in groups.items():
+            record(metrics, keys, result, elapsed)
+        return result
+
+    @staticmethod
+    def _record_get(metrics, _, entry, elapsed):
+        if entry is MISS:
+            metrics.misses += 1
+        else:
+            metrics.hits += 1
+        metrics.get_latency.observe(elapsed)
+
+    def _record_set(self, metrics, keys, _, elapsed):
+        metrics.sets += len(keys)
+        metrics.set_latency.observe(elapsed)
+        self._maybe_report()
+
+    @staticmethod
+    def _record_add(metrics, *_):
+        metrics.adds += 1
+
+    @staticmethod
+    def _record_delete(metrics, keys, *_):
+        metrics.deletes += len(keys)
+
+    @staticmethod
+    def _record_get_many(metrics, keys, entries, elapsed):
+        hits = sum(1 for key in keys if key in entries)
+        metrics.hits += hits
+        metrics.misses += len(keys) - hits
+        metrics.get_latency.observe(elapsed)
+
+    def get(self, key):
+        if self._async:
+            return self._call(self.engine.get, {self.metrics(key): (key,)}, (key,), self._record_get)
+        # inlined sync fast path, get is the hot operation
+        metrics = self.metrics(key)
+        start = time.perf_counter()
+        try:
+            entry = self.engine.get(key)
+        except Exception:
+            metrics.errors += 1
+            raise
+        metrics.get_latency.observe(time.perf_counter() - start)
+        if entry is MISS:
+            metrics.misses += 1
+        else:
+            metrics.hits += 1
+        return entry
+
+    def set(self, key, value, expiry=None):
+        return self._call(self.engine.set, {self.metrics(key): (key,)}, (key, value, expiry), self._record_set)
+
+    def add(self, key, value, expiry=None):
+        return self._call(self.engine.add, {self.metrics(key): (key,)}, (key, value, expiry), self._record_add)
+
+    def delete(self, key):
+        return self._call(self.engine.delete, {self.metrics(key): (key,)}, (key,), self._record_delete)
+
+    def get_many(self, keys):
+        keys = list(keys)
+        return self._call(self.engine.get_many, self._groups(keys), (keys,), self._record_get_many)
+
+    def set_many(self, mapping, expiry=None):
+        return self._call(self.engine.set_many, self._groups(mapping), (mapping, expiry), self._record_set)
+
+    def delete_many(self, keys):
+        keys = list(keys)
+        return self._call(self.engine.delete_many, self._groups(keys), (keys,), self._record_delete)
+
+    def __getattr__(self, name):
+        # engine specific methods and properties (purge, evictions, close ...)
+        if name == "engine":
+            raise AttributeError(name)
+        return getattr(self.engine, name)
+
+    def stats(self) -> dict:
+        """
+        :return: dict of label -> metrics snapshot, and ENGINE_LABEL -> counters of the wrapped engine
+        """
+        stats = {label: metrics.snapshot() for label, metrics in list(self._metrics.items())}
+        counters = {}
+        for counter in _ENGINE_COUNTERS:
+            value = getattr(self.engine, counter, None)
+            if isinstance(value, int):
+                counters[counter] = value
+        if counters:
+            stats[ENGINE_LABEL] = counters
+        return stats
+
+    def reset(self):
+        self._metrics = {}
+
+    def report(self):
+        """
+        Push the current snapshot to the sinks
+        """
+        self._reported_at = time.monotonic()
+        stats = self.stats()
+        for sink in self.sinks:
+            try:
+                sink(stats)
+            except Exception:
+                logging.getLogger(__name__).exception(f"Cache metrics sink {sink} failed")
+
+    def _maybe_report(self):
+        if self.report_interval is not None and time.monotonic() - self._reported_at >= self.report_interval:
+            self.report()
+
+
+class LogSink:
+    """
+    Metrics sink logging a line per metrics group through pytoolz.log (log_metrics)
+
+    >>> metrics = CacheMetrics()
+    >>> metrics.hits += 1
+    >>> LogSink()({"app.fn": metrics.snapshot()})
+    [app.fn] hits=1 misses=0 hit_ratio=1.000 sets=0 errors=0 get_mean_us=0.000
+
+    :param log_fn: log function receiving the label and the dict of metrics, by default the pytoolz.log one
+        (e.g. lambda label, metrics: logger.info(format_metrics(label, metrics)) to use a logger)
+    """
+
+    def __init__(self, log_fn: Callable = None):
+        self.log_fn = log_fn
+
+    def __call__(self, stats: dict):
+        # imported here: importing pytoolz.log configures the logging module (root logger)
+        from pytoolz.log.logperf import log_metrics
+        for label, metrics in stats.items():
+            line = {name: metrics[name] for name in ("hits", "misses", "hit_ratio", "sets", "errors", "evictions")
+                    if name in metrics}
+            get_latency = metrics.get("get_latency")
+            if get_latency is not None:
+                mean = get_latency["sum"] / get_latency["count"] if get_latency["count"] else 0.0
+                line["get_mean_us"] = mean * 1e6
+            if self.log_fn is None:
+                log_metrics(label, line)
+            else:
+                log_metrics(label, line, self.log_fn)
+
+
+def to_prometheus(stats: dict, namespace: str = "pytoolz_cache") -> str:
+    """
+    Render a stats() snapshot in the Prometheus text exposition format
+
+    >>> metrics = CacheMetrics(buckets=(0.001,))
+    >>> metrics.hits += 1
+    >>> metrics.get_latency.observe(0.0005)
+    >>> print(to_prometheus({"app.fn": metrics.snapshot()}).splitlines()[2])
+    pytoolz_cache_hits_total{function="app.fn"} 1
+    """
+    lines = []
+    for counter in _COUNTERS + _ENGINE_COUNTERS:
+        labels = [label for label, metrics in stats.items() if counter in metrics]
+        if not labels:
+            continue
+        lines.append(f"# HELP {namespace}_{counter}_total Cache {counter}")
+        lines.append(f"# TYPE {namespace}_{counter}_total counter")
+        for label in labels:
+            lines.append(f'{namespace}_{counter}_total{{function="{label}"}} {stats[label][counter]}')
+
+    for operation in ("get", "set"):
+        name = f"{namespace}_{operation}_latency_seconds"
+        lines.append(f"# HELP {name} Cache {operation} latency")
+        lines.append(f"# TYPE {name} histogram")
+        for label, metrics in stats.items():
+            histogram = metrics.get(f"{operation}_latency")
+            if histogram is None:
+                continue
+            cumulative = 0
+            for bound, count in histogram["buckets"].items():
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{name}_bucket{{function="{label}",le="{le}"}} {cumulative}')
+            lines.append(f'{name}_sum{{function="{label}"}} {histogram["sum"]}')
+            lines.append(f'{name}_count{{function="{label}"}} {histogram["count"]}')
+    return "\n".join(lines) + "\n"
+
+
+class PrometheusSink:
+    """
+    Metrics sink keeping the last snapshot, render() returns it in the Prometheus text format
+    (serve it from the /metrics endpoint of the application)
+
+    :param namespace: prefix of the metric names
+    """
+
+    def __init__(self, namespace: str = "pytoolz_cache"):
+        self.namespace = namespace
+        self._stats = {}
+
+    def __call__(self, stats: dict):
+        self._stats = stats
+
+    def render(self) -> str:
+        return to_prometheus(self._stats, self.namespace)
+
+
+if __name__ == "__main__":
+    import itertools
+    import timeit
+
+    from pytoolz.cache.memoize import InMemoryEngine
+
+    number = 200000
+    keys = itertools.cycle([f"pytoolz.fn::{i}" for i in range(1000)])
+    for name, engine in (("InMemoryEngine", InMemoryEngine(limit=500)),
+                         ("InstrumentedEngine", InstrumentedEngine(InMemoryEngine(limit=500)))):
+        set_time = timeit.timeit(lambda: engine.set(next(keys), 1), number=number)
+        get_time = timeit.timeit(lambda: engine.get(next(keys)), number=number)
+        print(f"{name:<20} set: {number / set_time:>10,.0f} ops/s  get: {number / get_time:>10,.0f} ops/s")
@@ -0,0 +1,506 @@
+import abc
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Iterable
+
+from pytoolz.cache.codec import Codec
+from pytoolz.cache.entries import MISS
+from pytoolz.cache.memoize import CacheEngine
+from pytoolz.ds.sketch import CountMinSketch
+
+__all__ = ["EvictionPolicy", "LRUPolicy", "LFUPolicy", "TwoQPolicy", "ARCPolicy", "TinyLFUPolicy", "POLICIES",
+           "PolicyEngine", "replay", "compare_policies"]
+
+
+class EvictionPolicy(metaclass=abc.ABCMeta):
+    """
+    Interface of a bounded mapping deciding which entry to evict when full.
+    Policies are not thread safe: PolicyEngine serializes the accesses
+    """
+
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError("capacity should be a positive number")
+        self.capacity = capacity
+        self.evictions = 0
+
+    @abc.abstractmethod
+    def get(self, key, default=MISS):
+        pass
+
+    @abc.abstractmethod
+    def set(self, key, value):
+        pass
+
+    @abc.abstractmethod
+    def delete(self, key):
+        pass
+
+    @abc.abstractmethod
+    def __len__(self):
+        pass
+
+
+class LRUPolicy(EvictionPolicy):
+    """
+    Least recently used
+
+    >>> policy = LRUPolicy(2)
+    >>> policy.set("a", 1); policy.set("b", 2); policy.get("a"); policy.set("c", 3)
+    1
+    >>> policy.get("b")
+    MISS
+    """
+
+    def __init__(self, capacity: int):
+        super().__init__(capacity)
+        self._data = OrderedDict()
+
+    def get(self, key, default=MISS):
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return default
+        return self._data[key]
+
+    def set(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.capacity:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key):
+        self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class LFUPolicy(EvictionPolicy):
+    """
+    Least frequently used (ties broken by recency) with aging: every aging_interval accesses
+    the frequencies are halved so that formerly popular keys can be evicted. O(1) get/set using frequency buckets
+
+    >>> policy = LFUPolicy(2)
+    >>> policy.set("a", 1); policy.get("a"); policy.set("b", 2); policy.set("c", 3)
+    1
+    >>> policy.get("a"), policy.get("b")
+    (1, MISS)
+    """
+
+    def __init__(self, capacity: int, aging_interval: int = None):
+        super().__init__(capacity)
+        self.aging_interval = aging_interval or 10 * capacity
+        self._values = {}
+        self._frequencies = {}
+        self._buckets = defaultdict(OrderedDict)
+        self._min_frequency = 0
+        self._accesses = 0
+
+    def _touch(self, key):
+        frequency = self._frequencies[key]
+        bucket = self._buckets[frequency]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[frequency]
+            if self._min_frequency == frequency:
+                self._min_frequency = frequency + 1
+        self._frequencies[key] = frequency + 1
+        self._buckets[frequency + 1][key] = None
+
+        self._accesses += 1
+        if self._accesses >= self.aging_interval:
+            self._age()
+
+    def _age(self):
+        self._accesses = 0
+        self._buckets = defaultdict(OrderedDict)
+        for key, frequency in self._frequencies.items():
+            self._frequencies[key] = max(frequency // 2, 1)
+            self._buckets[self._frequencies[key]][key] = None
+        self._min_frequency = min(self._buckets, default=0)
+
+    def get(self, key, default=MISS):
+        if key not in self._values:
+            return default
+        self._touch(key)
+        return self._values[key]
+
+    def set(self, key, value):
+        if key in self._values:
+            self._values[key] = value
+            self._touch(key)
+            return
+
+        if len(self._values) >= self.capacity:
+            bucket = self._buckets[self._min_frequency]
+            evicted, _ = bucket.popitem(last=False)
+            if not bucket:
+                del self._buckets[self._min_frequency]
+            del self._values[evicted]
+            del self._frequencies[evicted]
+            self.evictions += 1
+
+        self._values[key] = value
+        self._frequencies[key] = 1
+        self._buckets[1][key] = None
+        self._min_frequency = 1
+
+    def delete(self, key):
+        if key not in self._values:
+            return
+        del self._values[key]
+        frequency = self._frequencies.pop(key)
+        bucket = self._buckets[frequency]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[frequency]
+            if self._min_frequency == frequency:
+                self._min_frequency = min(self._buckets, default=0)
+
+    def __len__(self):
+        return len(self._values)
+
+
+class TwoQPolicy(EvictionPolicy):
+    """
+    2Q: new keys enter a FIFO (A1in), keys evicted from it are remembered in a ghost queue (A1out),
+    only keys seen again while remembered are promoted to the main LRU (Am): one-off scans never reach Am
+
+    >>> policy = TwoQPolicy(4)
+    >>> policy.set("a", 1); policy.get("a")
+    1
+    """
+
+    def __init__(self, capacity: int, in_ratio: float = 0.25, out_ratio: float = 0.5):
+        super().__init__(capacity)
+        self._in_size = max(1, int(capacity * in_ratio))
+        self._out_size = max(1, int(capacity * out_ratio))
+        self._a1in = OrderedDict()
+        self._a1out = OrderedDict()
+        self._am = OrderedDict()
+
+    def get(self, key, default=MISS):
+        if key in self._am:
+            self._am.move_to_end(key)
+            return self._am[key]
+        return self._a1in.get(key, default)
+
+    def _reclaim(self):
+        if len(self._a1in) + len(self._am) < self.capacity:
+            return
+        if len(self._a1in) > self._in_size or not self._am:
+            key, _ = self._a1in.popitem(last=False)
+            self._a1out[key] = None
+            if len(self._a1out) > self._out_size:
+                self._a1out.popitem(last=False)
+        else:
+            self._am.popitem(last=False)
+        self.evictions += 1
+
+    def set(self, key, value):
+        if key in self._am:
+            self._am[key] = value
+            self._am.move_to_end(key)
+        elif key in self._a1in:
+            self._a1in[key] = value
+        elif key in self._a1out:
+            del self._a1out[key]
+            self._reclaim()
+            self._am[key] = value
+        else:
+            self._reclaim()
+            self._a1in[key] = value
+
+    def delete(self, key):
+        self._am.pop(key, None)
+        self._a1in.pop(key, None)
+
+    def __len__(self):
+        return len(self._a1in) + len(self._am)
+
+
+class ARCPolicy(EvictionPolicy):
+    """
+    Adaptive Replacement Cache: balances a recency list (T1) and a frequency list (T2),
+    adapting the target size of T1 using the ghost lists of recently evicted keys (B1, B2)
+
+    >>> policy = ARCPolicy(2)
+    >>> policy.set("a", 1); policy.get("a"); policy.set("b", 2); policy.set("c", 3)
+    1
+    >>> policy.get("a")
+    1
+    """
+
+    def __init__(self, capacity: int):
+        super().__init__(capacity)
+        self._p = 0
+        self._t1 = OrderedDict()
+        self._t2 = OrderedDict()
+        self._b1 = OrderedDict()
+        self._b2 = OrderedDict()
+
+    def get(self, key, default=MISS):
+        if key in self._t1:
+            value = self._t1.pop(key)
+            self._t2[key] = value
+            return value
+        if key in self._t2:
+            self._t2.move_to_end(key)
+            return self._t2[key]
+        return default
+
+    def _replace(self, in_b2: bool):
+        if len(self._t1) + len(self._t2) < self.capacity:
+            return
+        if self._t1 and (len(self._t1) > self._p or (in_b2 and len(self._t1) == self._p)):
+            key, _ = self._t1.popitem(last=False)
+            self._b1[key] = None
+        else:
+            key, _ = self._t2.popitem(last=False)
+            self._b2[key] = None
+        self.evictions += 1
+
+    def set(self, key, value):
+        if key in self._t1 or key in self._t2:
+            self.get(key)
+            self._t2[key] = value
+            return
+
+        capacity = self.capacity
+        if key in self._b1:
+            self._p = min(capacity, self._p + max(len(self._b2) / len(self._b1), 1))
+            self._replace(False)
+            del self._b1[key]
+            self._t2[key] = value
+            return
+        if key in self._b2:
+            self._p = max(0, self._p - max(len(self._b1) / len(self._b2), 1))
+            self._replace(True)
+            del self._b2[key]
+            self._t2[key] = value
+            return
+
+        l1 = len(self._t1) + len(self._b1)
+        total = l1 + len(self._t2) + len(self._b2)
+        if l1 >= capacity:
+            if len(self._t1) < capacity:
+                self._b1.popitem(last=False)
+                self._replace(False)
+            else:
+                self._t1.popitem(last=False)
+                self.evictions += 1
+        elif total >= capacity:
+            if total >= 2 * capacity:
+                self._b2.popitem(last=False)
+            self._replace(False)
+        self._t1[key] = value
+
+    def delete(self, key):
+        self._t1.pop(key, None)
+        self._t2.pop(key, None)
+
+    def __len__(self):
+        return len(self._t1) + len(self._t2)
+
+
+class TinyLFUPolicy(EvictionPolicy):
+    """
+    W-TinyLFU: a small LRU window admits new keys, keys evicted from the window compete to enter
+    the main segmented LRU (probation + protected) against its victim, the most frequently used
+    (according to a count-min sketch recording every get) wins. Resists scans while adapting to recency
+
+    >>> policy = TinyLFUPolicy(10)
+    >>> policy.set("a", 1); policy.get("a")
+    1
+
+    The window is part of the capacity
+    >>> policy = TinyLFUPolicy(1)
+    >>> policy.set("a", 1); policy.set("b", 2); len(policy)
+    1
+    """
+
+    def __init__(self, capacity: int, window_ratio: float = 0.01, protected_ratio: float = 0.8):
+        super().__init__(capacity)
+        # a single entry cache has no room for a window: new keys compete directly for the main segment
+        self._window_size = max(1, int(capacity * window_ratio)) if capacity > 1 else 0
+        main_size = capacity - self._window_size
+        self._protected_size = max(1, int(main_size * protected_ratio))
+        self._main_size = main_size
+        self._window = OrderedDict()
+        self._probation = OrderedDict()
+        self._protected = OrderedDict()
+        self.sketch = CountMinSketch(capacity)
+
+    def get(self, key, default=MISS):
+        self.sketch.add(key)
+        if key in self._window:
+            self._window.move_to_end(key)
+            return self._window[key]
+        if key in self._protected:
+            self._protected.move_to_end(key)
+            return self._protected[key]
+        if key in self._probation:
+            value = self._probation.pop(key)
+            self._protected[key] = value
+            if len(self._protected) > self._protected_size:
+                demoted, demoted_value = self._protected.popitem(last=False)
+                self._probation[demoted] = demoted_value
+            return value
+        return default
+
+    def _admit(self, key, value):
+        if len(self._probation) + len(self._protected) < self._main_size:
+            self._probation[key] = value
+            return
+        victim = next(iter(self._probation or self._protected))
+        if self.sketch.estimate(key) > self.sketch.estimate(victim):
+            (self._probation if victim in self._probation else self._protected).pop(victim)
+            self._probation[key] = value
+        self.evictions += 1
+
+    def set(self, key, value):
+        for segment in (self._window, self._probation, self._protected):
+            if key in segment:
+                segment[key] = value
+                return
+
+        self._window[key] = value
+        if len(self._window) > self._window_size:
+            candidate, candidate_value = self._window.popitem(last=False)
+            self._admit(candidate, candidate_value)
+
+    def delete(self, key):
+        for segment in (self._window, self._probation, self._protected):
+            segment.pop(key, None)
+
+    def __len__(self):
+        return len(self._window) + len(self._probation) + len(self._protected)
+
+
+POLICIES = {
+    "lru": LRUPolicy,
+    "lfu": LFUPolicy,
+    "2q": TwoQPolicy,
+    "arc": ARCPolicy,
+    "tinylfu": TinyLFUPolicy,
+}
+
+
+class PolicyEngine(CacheEngine):
+    """
+    Thread safe in-process engine with a selectable eviction policy (lru, lfu, 2q, arc, tinylfu)
+    and per-entry expiry. Use scan resistant policies (tinylfu, arc, 2q) when a stable hot set is mixed
+    with large one-off scans
+
+    Basic Usage:
+    >>> engine = PolicyEngine(100, policy="tinylfu")
+    >>> engine.set("a", 1)
+    >>> engine.get("a")
+    1
+    >>> engine.get("b")
+    MISS
+
+    :param limit: max number of entries
+    :param policy: policy name (see POLICIES) or EvictionPolicy instance
+    :param expiration: default expiry in seconds of the entries, 0 means no expiry
+    :param codec: optional codec used to store values as bytes
+    """
+
+    def __init__(self, limit: int, policy="tinylfu", expiration: int = 0, codec: Codec = None):
+        self.policy = POLICIES[policy](limit) if isinstance(policy, str) else policy
+        self.expiration = expiration
+        self.codec = codec
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self.policy.get(key)
+            if entry is MISS:
+                return MISS
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self.policy.delete(key)
+                return MISS
+        return self._decode(value)
+
+    def set(self, key, value, expiry=None):
+        expiry = expiry or self.expiration
+        entry = (self._encode(value), time.monotonic() + expiry if expiry else None)
+        with self._lock:
+            self.policy.set(key, entry)
+
+    def delete(self, key):
+        with self._lock:
+            self.policy.delete(key)
+
+    @property
+    def evictions(self):
+        return self.policy.evictions
+
+    def __len__(self):
+        return len(self.policy)
+
+
+def replay(trace: Iterable, policy: EvictionPolicy) -> dict:
+    """
+    Replay a trace of keys against a policy: every miss is followed by a set
+
+    >>> stats = replay([1, 2, 1, 3, 1], LRUPolicy(2))
+    >>> stats["hits"], stats["misses"], stats["hit_ratio"]
+    (2, 3, 0.4)
+
+    :param trace: iterable of keys
+    :param policy: EvictionPolicy instance
+    :return: dict with hits, misses, hit ratio and operations per second
+    """
+    hits = misses = 0
+    get, set_ = policy.get, policy.set
+    start = time.perf_counter()
+    for key in trace:
+        if get(key) is MISS:
+            misses += 1
+            set_(key, key)
+        else:
+            hits += 1
+    elapsed = time.perf_counter() - start
+    accesses = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": hits / accesses if accesses else 0.0,
+        "ops_per_sec": accesses / elapsed if elapsed else float("inf"),
+    }
+
+
+def compare_policies(trace: Iterable, capacity: int, policies: Iterable = tuple(POLICIES)) -> dict:
+    """
+    Replay the same trace against different policies
+    :param trace: iterable of keys (materialized once)
+    :param capacity: capacity of every policy
+    :param policies: policy names
+    :return: dict policy name -> replay stats
+    """
+    trace = list(trace)
+    return {name: replay(trace, POLICIES[name](capacity)) for name in policies}
+
+
+if __name__ == "__main__":
+    import random
+
+    random.seed(42)
+    hot_keys = [f"hot-{i}" for i in range(5000)]
+    weights = [1 / (rank + 1) ** 0.9 for rank in range(len(hot_keys))]
+
+    def workload(rounds=10, hot_accesses=50000, scan_size=20000):
+        """
+        Zipf distributed accesses to a stable hot set interleaved with one-off scans
+        """
+        for scan in range(rounds):
+            yield from random.choices(hot_keys, weights, k=hot_accesses)
+            yield from (f"scan-{scan}-{i}" for i in range(scan_size))
+
+    for name, stats in compare_policies(workload(), capacity=1000).items():
+        print(f"{name:<8} hit ratio: {stats['hit_ratio']:.3f}  ops/sec: {stats['ops_per_sec']:>12,.0f}")
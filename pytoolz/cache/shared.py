@@ -0,0 +1,310 @@
+import contextlib
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from pytoolz.cache.codec import Codec
+from pytoolz.cache.entries import MISS
+from pytoolz.cache.memoize import CacheEngine
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+
+__all__ = ["SharedMemoryEngine", ]
+
+_MAGIC = b"PTZCACHE"
+_HEADER = struct.Struct("<8sIII")  # magic, slots, slot size, ways
+_HEADER_SIZE = 64
+# sequence counter (odd while the slot is written), key digest, expires at (0: never), last access,
+# key size (0: empty slot), value size
+_SLOT = struct.Struct("<QQddHI")
+_SEQ = struct.Struct("<Q")
+_DIGEST = struct.Struct("<Q")
+_ACCESS = struct.Struct("<d")
+_ACCESS_OFFSET = 24
+_READ_RETRIES = 8
+
+
+def _default_path() -> str:
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, "pytoolz-cache")
+
+
+def _key_bytes(key) -> bytes:
+    return key if isinstance(key, bytes) else str(key).encode()
+
+
+def _digest(key: bytes) -> int:
+    # stable across processes (hash() of str is randomized per process), 0 marks the empty slots in the index
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") or 1
+
+
+class SharedMemoryEngine(CacheEngine):
+    """
+    Cross-process engine: a fixed-slot hash table in a memory-mapped file (in /dev/shm by default, so RAM backed)
+    shared by every process opening the same path, e.g. the workers of a gunicorn or multiprocessing pool:
+    one copy of the cache per host instead of one per worker.
+    Keys hash to a bucket of `ways` slots of `slot_size` bytes each: a value bigger than a slot is not stored,
+    a full bucket evicts its least recently used slot, expired slots are reused.
+    Reads take no lock and make no syscall: the digests of the keys of a bucket are contiguous (one unpack finds
+    the slot) and every slot is guarded by a sequence counter (seqlock), a read racing with a write is retried.
+    Writes lock their bucket only (byte range lock on the file)
+
+    Basic Usage:
+    >>> path = os.path.join(tempfile.mkdtemp(), "cache")
+    >>> engine = SharedMemoryEngine(path, slots=64, slot_size=256)
+    >>> engine.set("a", {"x": 1})
+    >>> engine.get("a"), engine.get("b")
+    ({'x': 1}, MISS)
+
+    Every engine (process) mapping the same file sees the same entries
+    >>> SharedMemoryEngine(path, slots=64, slot_size=256).get("a")
+    {'x': 1}
+    >>> engine.add("a", 2, 60), engine.add("b", 2, 60)
+    (False, True)
+
+    Per-entry expiry, values bigger than a slot are not stored
+    >>> engine.set("c", 3, expiry=0.05)
+    >>> time.sleep(0.1)
+    >>> engine.get("c"), len(engine)
+    (MISS, 2)
+    >>> engine.set("d", os.urandom(1024))
+    >>> engine.get("d"), engine.rejected
+    (MISS, 1)
+    >>> engine.unlink()
+
+    :param path: file backing the table, created if missing (all the engines sharing it must use the same layout)
+    :param slots: number of slots (max number of entries)
+    :param slot_size: bytes per slot: 38 bytes of header, the key and the encoded value
+    :param ways: slots per bucket, a key can be stored in any slot of its bucket
+    :param expiration: default expiry in seconds of the entries, 0 means no expiry
+    :param codec: codec used to store values as bytes, Codec() by default
+    """
+
+    def __init__(self, path: str = None, slots: int = 65536, slot_size: int = 1024, ways: int = 8,
+                 expiration: int = 0, codec: Codec = None):
+        if fcntl is None:
+            raise RuntimeError("SharedMemoryEngine requires fcntl file locks (POSIX)")
+        if slot_size <= _SLOT.size:
+            raise ValueError(f"Invalid slot size: {slot_size}, min {_SLOT.size + 1}")
+        ways = max(1, min(ways, slots))
+        self._buckets = max(1, -(-slots // ways))
+        self.path = path or _default_path()
+        self.slots = self._buckets * ways
+        self.slot_size = slot_size
+        self.ways = ways
+        self.expiration = expiration
+        self.codec = codec or Codec()
+        self.evictions = self.rejected = 0
+        self._capacity = slot_size - _SLOT.size
+        self._bucket_size = ways * slot_size
+        self._index = struct.Struct(f"<{ways}Q")
+        self._slots_start = _HEADER_SIZE + self.slots * _DIGEST.size
+        self._lock = threading.Lock()  # file locks are per process: threads are serialized here
+        self._fd, self._map = self._open()
+
+    def _open(self):
+        size = self._slots_start + self.slots * self.slot_size
+        layout = (_MAGIC, self.slots, self.slot_size, self.ways)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_EX)  # the first process initializes the file
+            try:
+                if os.fstat(fd).st_size == 0:
+                    os.ftruncate(fd, size)
+                    os.pwrite(fd, _HEADER.pack(*layout), 0)
+                elif _HEADER.unpack(os.pread(fd, _HEADER.size, 0)) != layout:
+                    raise ValueError(f"{self.path} contains a table with a different layout")
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN)
+            return fd, mmap.mmap(fd, size)
+        except BaseException:
+            os.close(fd)
+            raise
+
+    def __reduce__(self):
+        # processes started with spawn open (map) the same file
+        return type(self), (self.path, self.slots, self.slot_size, self.ways, self.expiration, self.codec)
+
+    def _bucket(self, digest: int) -> range:
+        start = self._slots_start + digest % self._buckets * self._bucket_size
+        return range(start, start + self._bucket_size, self.slot_size)
+
+    def _index_offset(self, offset: int) -> int:
+        """
+        Offset of the digest of a slot in the index
+        """
+        return _HEADER_SIZE + (offset - self._slots_start) // self.slot_size * _DIGEST.size
+
+    @contextlib.contextmanager
+    def _locked(self, bucket: range):
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, self._bucket_size, bucket.start)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, self._bucket_size, bucket.start)
+
+    def _read(self, offset: int, digest: int, key: bytes, now: float):
+        """
+        Value stored in the slot for the key, None if the slot holds another key or an expired entry
+        """
+        table = self._map
+        for _ in range(_READ_RETRIES):
+            seq, stored, expires_at, _, key_size, value_size = _SLOT.unpack_from(table, offset)
+            if seq & 1:  # being written
+                continue
+            if stored != digest or not key_size:
+                return None
+            start = offset + _SLOT.size
+            data = table[start:start + key_size + value_size]
+            if _SEQ.unpack_from(table, offset)[0] != seq:  # overwritten while reading
+                continue
+            if data[:key_size] != key or (expires_at and expires_at <= now):
+                return None
+            # racy on purpose: the access time only drives the eviction
+            _ACCESS.pack_into(table, offset + _ACCESS_OFFSET, now)
+            return data[key_size:]
+        return None
+
+    def _write(self, offset: int, digest: int = 0, key: bytes = b"", data: bytes = b"", expires_at: float = 0,
+               now: float = 0):
+        table = self._map
+        seq = _SEQ.unpack_from(table, offset)[0] + 1
+        _SEQ.pack_into(table, offset, seq)
+        start = offset + _SLOT.size
+        table[start:start + len(key) + len(data)] = key + data
+        _SLOT.pack_into(table, offset, seq, digest, expires_at, now, len(key), len(data))
+        _SEQ.pack_into(table, offset, seq + 1)
+        _DIGEST.pack_into(table, self._index_offset(offset), digest)
+
+    def _find(self, bucket: range, digest: int, key: bytes, now: float) -> tuple:
+        """
+        Slot holding the key (and whether its entry is alive), first free (or expired) slot
+        and least recently used slot of the bucket
+        """
+        table = self._map
+        free = victim = None
+        oldest = float("inf")
+        for offset in bucket:
+            _, stored, expires_at, accessed, key_size, _ = _SLOT.unpack_from(table, offset)
+            expired = bool(expires_at and expires_at <= now)
+            start = offset + _SLOT.size
+            if key_size and stored == digest and table[start:start + key_size] == key:
+                return offset, not expired, free, victim
+            if not key_size or expired:
+                if free is None:
+                    free = offset
+            elif accessed < oldest:
+                oldest, victim = accessed, offset
+        return None, False, free, victim
+
+    def _store(self, key, value, expiry, only_new: bool) -> bool:
+        key = _key_bytes(key)
+        data = self._encode(value)
+        digest = _digest(key)
+        bucket = self._bucket(digest)
+        if len(key) + len(data) > self._capacity:
+            self.rejected += 1
+            self._delete(bucket, digest, key)  # don't serve the previous value
+            return False
+        expiry = expiry or self.expiration
+        with self._locked(bucket):
+            now = time.time()
+            offset, alive, free, victim = self._find(bucket, digest, key, now)
+            if alive and only_new:
+                return False
+            if offset is None:
+                offset = free
+            if offset is None:
+                offset = victim
+                self.evictions += 1
+            self._write(offset, digest, key, data, now + expiry if expiry else 0, now)
+        return True
+
+    def _delete(self, bucket: range, digest: int, key: bytes):
+        with self._locked(bucket):
+            offset = self._find(bucket, digest, key, time.time())[0]
+            if offset is not None:
+                self._write(offset)
+
+    def get(self, key):
+        key = _key_bytes(key)
+        digest = _digest(key)
+        bucket = self._bucket(digest)
+        digests = self._index.unpack_from(self._map, self._index_offset(bucket.start))
+        if digest not in digests:
+            return MISS
+        data = self._read(bucket[digests.index(digest)], digest, key, time.time())
+        return MISS if data is None else self._decode(data)
+
+    def set(self, key, value, expiry=None):
+        self._store(key, value, expiry, only_new=False)
+
+    def add(self, key, value, expiry=None):
+        return self._store(key, value, expiry, only_new=True)
+
+    def delete(self, key):
+        key = _key_bytes(key)
+        digest = _digest(key)
+        self._delete(self._bucket(digest), digest, key)
+
+    def _slots(self):
+        return range(self._slots_start, self._slots_start + self.slots * self.slot_size, self.slot_size)
+
+    def purge(self):
+        """
+        Free the slots of the expired entries
+        """
+        now = time.time()
+        for start in self._slots()[::self.ways]:
+            bucket = range(start, start + self._bucket_size, self.slot_size)
+            with self._locked(bucket):
+                for offset in bucket:
+                    _, _, expires_at, _, key_size, _ = _SLOT.unpack_from(self._map, offset)
+                    if key_size and expires_at and expires_at <= now:
+                        self._write(offset)
+
+    def __len__(self):
+        now = time.time()
+        count = 0
+        for offset in self._slots():
+            _, _, expires_at, _, key_size, _ = _SLOT.unpack_from(self._map, offset)
+            if key_size and not (expires_at and expires_at <= now):
+                count += 1
+        return count
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+    def unlink(self):
+        """
+        Close the engine and remove the backing file (engines of other processes keep their mapping)
+        """
+        self.close()
+        os.unlink(self.path)
+
+
+if __name__ == "__main__":
+    import timeit
+
+    from pytoolz.cache.memoize import InMemoryEngine
+
+    shared = SharedMemoryEngine(os.path.join(tempfile.mkdtemp(), "cache"), slots=2 ** 16)
+    engines = {"InMemoryEngine": InMemoryEngine(2 ** 16, codec=Codec()), "SharedMemoryEngine": shared}
+    value = {"id": 1, "name": "x" * 100}
+    for name, engine in engines.items():
+        for index in range(10000):
+            engine.set(f"key:{index}", value)
+        get = timeit.timeit(lambda: engine.get("key:42"), number=100000) / 100000
+        miss = timeit.timeit(lambda: engine.get("missing"), number=100000) / 100000
+        put = timeit.timeit(lambda: engine.set("key:42", value), number=100000) / 100000
+        print(f"{name:<20} get {get * 1e6:6.2f}µs  miss {miss * 1e6:6.2f}µs  set {put * 1e6:6.2f}µs")
+    shared.unlink()
@@ -0,0 +1,202 @@
+import collections
+import logging
+import queue
+import sys
+import threading
+from typing import Callable
+
+from pytoolz.cache.entries import MISS
+from pytoolz.cache.memoize import CacheEngine, InMemoryEngine
+
+__all__ = ["TieredEngine", ]
+
+logger = logging.getLogger(__name__)
+
+
+class TieredEngine(CacheEngine):
+    """
+    Two tiers cache engine: a bounded in-process L1 in front of any (shared) L2 engine.
+    Hot keys are served from local memory, L2 hits fill L1, writes go to both tiers.
+
+    Basic Usage:
+    >>> from pytoolz.cache import InMemoryEngine
+    >>> engine = TieredEngine(InMemoryEngine(limit=100), limit=2)
+    >>> engine.set("a", 1)
+    >>> engine.get("a")
+    1
+    >>> engine.stats()
+    {'l1': {'hits': 1, 'misses': 0}, 'l2': {'hits': 0, 'misses': 0}}
+
+    L1 is bounded, evicted keys are still served by L2 and copied back in L1
+    >>> engine.set("b", 2)
+    >>> engine.set("c", 3)
+    >>> engine.get("a")
+    1
+    >>> engine.stats()
+    {'l1': {'hits': 1, 'misses': 1}, 'l2': {'hits': 1, 'misses': 0}}
+
+    L1 entries expire after l1_expiry seconds: updates made by other processes (directly in L2) become visible
+    >>> import time
+    >>> engine = TieredEngine(InMemoryEngine(limit=100), l1_expiry=0.05)
+    >>> engine.set("a", 1)
+    >>> engine.l2.set("a", 2)
+    >>> engine.get("a")
+    1
+    >>> time.sleep(0.1)
+    >>> engine.get("a")
+    2
+
+    Write behind: L2 writes run in a background thread, sets and deletes reach L2 in their order
+    >>> engine = TieredEngine(InMemoryEngine(limit=100), write_behind=True)
+    >>> engine.set("k", 1)
+    >>> engine.delete("k")
+    >>> engine.get("k")
+    MISS
+    >>> engine.flush()
+    >>> engine.l2.get("k"), engine.get("k")
+    (MISS, MISS)
+
+    :param l2: second tier engine (RedisEngine, MemcachedEngine, FileEngine ...)
+    :param limit: max number of entries kept in L1
+    :param max_bytes: max size of L1 in bytes, estimated using the sizeof function
+    :param l1_expiry: max time in seconds an entry lives in L1, bounds staleness across processes
+        (L1 does not see the writes of other processes)
+    :param write_behind: write L2 asynchronously from a background thread (failed writes are logged and dropped):
+        sets and deletes reach L2 in order, keys being deleted are not read from L2, add waits for the pending writes
+    :param max_pending: max number of pending write-behind operations, writers block when it is reached
+    :param sizeof: function used to estimate the size of a value
+    """
+
+    def __init__(self, l2: CacheEngine, limit: int = 1024, max_bytes: int = None, l1_expiry: int = 60,
+                 write_behind: bool = False, max_pending: int = 10000, sizeof: Callable = sys.getsizeof):
+        self.l1 = InMemoryEngine(limit, max_bytes=max_bytes, sizeof=sizeof)
+        self.l2 = l2
+        self.l1_expiry = l1_expiry
+        self.l1_hits = self.l1_misses = self.l2_hits = self.l2_misses = 0
+
+        self._queue = None
+        self._deleting = collections.Counter()  # key -> pending write-behind deletes
+        self._deleting_lock = threading.Lock()
+        if write_behind:
+            self._queue = queue.Queue(max_pending)
+            threading.Thread(target=self._write_behind, daemon=True).start()
+
+    def _l1_expiry(self, expiry):
+        return min(filter(None, (expiry, self.l1_expiry)), default=None)
+
+    def _write_behind(self):
+        while True:
+            method, key, args = self._queue.get()
+            try:
+                method(*args)
+            except Exception:
+                logger.exception(f"Write behind {method.__name__} of {key} failed")
+            finally:
+                self._queue.task_done()
+
+    def _delete_behind(self, keys: list):
+        with self._deleting_lock:
+            self._deleting.update(keys)
+        self._queue.put((self._l2_delete, keys[0] if len(keys) == 1 else keys, (keys,)))
+
+    def _l2_delete(self, keys: list):
+        try:
+            if len(keys) == 1:
+                self.l2.delete(keys[0])
+            else:
+                self.l2.delete_many(keys)
+        finally:
+            with self._deleting_lock:
+                self._deleting.subtract(keys)
+                for key in keys:
+                    if self._deleting[key] <= 0:
+                        del self._deleting[key]
+
+    def get(self, key):
+        entry = self.l1.get(key)
+        if entry is not MISS:
+            self.l1_hits += 1
+            return entry
+        self.l1_misses += 1
+
+        entry = MISS if key in self._deleting else self.l2.get(key)
+        if entry is MISS:
+            self.l2_misses += 1
+            return MISS
+        self.l2_hits += 1
+        self.l1.set(key, entry, self._l1_expiry(None))
+        return entry
+
+    def set(self, key, value, expiry=None):
+        self.l1.set(key, value, self._l1_expiry(expiry))
+        if self._queue is not None:
+            self._queue.put((self.l2.set, key, (key, value, expiry)))
+        else:
+            self.l2.set(key, value, expiry)
+
+    def add(self, key, value, expiry=None):
+        self.flush()  # the key may be set or deleted by a pending write
+        added = self.l2.add(key, value, expiry)
+        if added:
+            self.l1.set(key, value, self._l1_expiry(expiry))
+        return added
+
+    def delete(self, key):
+        self.l1.delete(key)
+        if self._queue is not None:
+            self._delete_behind([key])
+        else:
+            self.l2.delete(key)
+
+    def get_many(self, keys):
+        entries, missing = {}, []
+        for key in keys:
+            entry = self.l1.get(key)
+            if entry is not MISS:
+                entries[key] = entry
+            else:
+                missing.append(key)
+        self.l1_hits += len(entries)
+        self.l1_misses += len(missing)
+
+        if missing:
+            found = self.l2.get_many([key for key in missing if key not in self._deleting])
+            self.l2_hits += len(found)
+            self.l2_misses += len(missing) - len(found)
+            l1_expiry = self._l1_expiry(None)
+            for key, entry in found.items():
+                self.l1.set(key, entry, l1_expiry)
+            entries.update(found)
+        return entries
+
+    def set_many(self, mapping, expiry=None):
+        l1_expiry = self._l1_expiry(expiry)
+        for key, value in mapping.items():
+            self.l1.set(key, value, l1_expiry)
+        if self._queue is not None:
+            for key, value in mapping.items():
+                self._queue.put((self.l2.set, key, (key, value, expiry)))
+        else:
+            self.l2.set_many(mapping, expiry)
+
+    def delete_many(self, keys):
+        keys = list(keys)
+        for key in keys:
+            self.l1.delete(key)
+        if self._queue is not None and keys:
+            self._delete_behind(keys)
+        else:
+            self.l2.delete_many(keys)
+
+    def flush(self):
+        """
+        Block until every pending write-behind operation reached L2
+        """
+        if self._queue is not None:
+            self._queue.join()
+
+    def stats(self):
+        return {
+            "l1": {"hits": self.l1_hits, "misses": self.l1_misses},
+            "l2": {"hits": self.l2_hits, "misses": self.l2_misses},
+        }
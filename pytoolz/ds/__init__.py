@@ -1 +1,2 @@
 from .linkedlist import *
+from .sketch import *
@@ -0,0 +1,120 @@
+import math
+
+__all__ = ["CountMinSketch", "BloomFilter"]
+
+_MIX = 0x9E3779B97F4A7C15
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+
+
+class CountMinSketch:
+    """
+    Approximate frequency counter using a fixed amount of memory.
+    Counters saturate at max_count and are halved every sample_size additions (aging),
+    so that the popularity of old items fades out.
+
+    Basic Usage:
+    >>> sketch = CountMinSketch(64)
+    >>> for _ in range(5):
+    ...     sketch.add("a")
+    >>> sketch.estimate("a")
+    5
+    >>> sketch.estimate("b")
+    0
+
+    :param width: number of counters per row (rounded up to a power of 2)
+    :param depth: number of rows (hash functions)
+    :param sample_size: number of additions after which the counters are halved, default 10 * width
+    :param max_count: max value of a counter
+    """
+
+    def __init__(self, width: int, depth: int = 4, sample_size: int = None, max_count: int = 15):
+        self.width = 1 << max(width - 1, 1).bit_length()
+        self.depth = depth
+        self.sample_size = sample_size or 10 * self.width
+        self.max_count = max_count
+        self.additions = 0
+        self._mask = self.width - 1
+        self._rows = [[0] * self.width for _ in range(depth)]
+
+    def _hashes(self, item):
+        h = (hash(item) * _MIX) & _MASK64
+        return h & 0xFFFFFFFF, (h >> 32) | 1
+
+    def add(self, item):
+        index, step = self._hashes(item)
+        mask, max_count = self._mask, self.max_count
+        for row in self._rows:
+            if row[index & mask] < max_count:
+                row[index & mask] += 1
+            index += step
+
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self.age()
+
+    def estimate(self, item) -> int:
+        index, step = self._hashes(item)
+        mask = self._mask
+        count = self.max_count
+        for row in self._rows:
+            count = min(count, row[index & mask])
+            index += step
+        return count
+
+    def age(self):
+        """
+        Halve all the counters
+        """
+        self._rows = [[count >> 1 for count in row] for row in self._rows]
+        self.additions //= 2
+
+
+class BloomFilter:
+    """
+    Approximate set membership using a fixed amount of memory: no false negatives,
+    false positives with probability error_rate once capacity items have been added
+
+    Basic Usage:
+    >>> bloom = BloomFilter(1000)
+    >>> bloom.add("a")
+    True
+    >>> bloom.add("a")
+    False
+    >>> "a" in bloom, "b" in bloom
+    (True, False)
+
+    :param capacity: expected number of items
+    :param error_rate: false positive probability at capacity
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = bits
+        self.hashes = max(1, round(bits / capacity * math.log(2)))
+        self._bits = bytearray((bits + 7) // 8)
+
+    def _positions(self, item):
+        h = (hash(item) * _MIX) & _MASK64
+        index, step = h & 0xFFFFFFFF, (h >> 32) | 1
+        for _ in range(self.hashes):
+            yield index % self.size
+            index += step
+
+    def add(self, item) -> bool:
+        """
+        Add the item, return True if it was not (probably) in the filter
+        """
+        added = False
+        bits = self._bits
+        for position in self._positions(item):
+            byte, mask = position >> 3, 1 << (position & 7)
+            if not bits[byte] & mask:
+                bits[byte] |= mask
+                added = True
+        return added
+
+    def __contains__(self, item) -> bool:
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
@@ -1,2 +1,7 @@
 from .pipe import *
+from .fusion import *
+from .profiling import *
+from .vectorized import *
+from .windowing import *
 from .iterables import *
+from .astream import *
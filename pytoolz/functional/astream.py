@@ -0,0 +1,401 @@
+import asyncio
+import collections
+import inspect
+from decimal import Decimal
+from typing import AsyncIterable, AsyncIterator, Callable, Iterable, List, Union
+
+__all__ = ["AStream", ]
+
+_DONE = object()
+
+
+async def _call(fn: Callable, element):
+    """
+    Call a sync or async function
+    """
+    result = fn(element)
+    if inspect.isawaitable(result):
+        return await result
+    return result
+
+
+async def _aclose(source: AsyncIterator):
+    """
+    Close an async generator stopped early: its cleanup (finally blocks, in flight calls) runs now,
+    not when it is garbage collected or the loop shuts down
+    """
+    aclose = getattr(source, "aclose", None)
+    if aclose is not None:
+        await aclose()
+
+
+async def _aiter(iterable: Union[Iterable, AsyncIterable]) -> AsyncIterator:
+    if hasattr(iterable, "__aiter__"):
+        iterator = iterable.__aiter__()
+        try:
+            async for element in iterator:
+                yield element
+        finally:
+            await _aclose(iterator)
+    else:
+        for element in iterable:
+            yield element
+
+
+async def _map(fn: Callable, source: AsyncIterator, concurrency: int = 1, ordered: bool = True):
+    if concurrency <= 1:
+        try:
+            async for element in source:
+                yield await _call(fn, element)
+        finally:
+            await _aclose(source)
+        return
+
+    pending = collections.deque() if ordered else set()
+    try:
+        async for element in source:
+            task = asyncio.ensure_future(_call(fn, element))
+            if ordered:
+                pending.append(task)
+                if len(pending) >= concurrency:
+                    yield await pending.popleft()
+            else:
+                pending.add(task)
+                if len(pending) >= concurrency:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield task.result()
+        while pending:
+            if ordered:
+                yield await pending.popleft()
+            else:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        await _aclose(source)
+
+
+async def _filter(fn: Callable, source: AsyncIterator):
+    try:
+        async for element in source:
+            if await _call(fn, element):
+                yield element
+    finally:
+        await _aclose(source)
+
+
+async def _flat_map(fn: Callable, source: AsyncIterator):
+    try:
+        async for element in source:
+            results = _aiter(await _call(fn, element))
+            try:
+                async for result in results:
+                    yield result
+            finally:
+                await _aclose(results)
+    finally:
+        await _aclose(source)
+
+
+async def _take(limit: int, source: AsyncIterator):
+    try:
+        if limit <= 0:
+            return
+        count = 0
+        async for element in source:
+            yield element
+            count += 1
+            if count >= limit:
+                return
+    finally:
+        await _aclose(source)
+
+
+async def _batch(size: int, source: AsyncIterator):
+    try:
+        batch = []
+        async for element in source:
+            batch.append(element)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        await _aclose(source)
+
+
+async def _buffer(size: int, source: AsyncIterator):
+    """
+    Consume the source from a background task into a bounded queue: the producer runs ahead
+    of the consumer by at most size elements (back pressure)
+    """
+    queue = asyncio.Queue(maxsize=size)
+
+    async def produce():
+        try:
+            async for element in source:
+                await queue.put((element, None))
+            await queue.put((_DONE, None))
+        except Exception as e:
+            await queue.put((_DONE, e))
+
+    producer = asyncio.ensure_future(produce())
+    try:
+        while True:
+            element, error = await queue.get()
+            if error is not None:
+                raise error
+            if element is _DONE:
+                return
+            yield element
+    finally:
+        producer.cancel()
+        # the source can be closed only once the producer stopped iterating it
+        await asyncio.gather(producer, return_exceptions=True)
+        await _aclose(source)
+
+
+_STAGES = {
+    "map": lambda args, source: _map(args[0], source, *args[1:]),
+    "filter": lambda fn, source: _filter(fn, source),
+    "flat_map": lambda fn, source: _flat_map(fn, source),
+    "take": lambda limit, source: _take(limit, source),
+    "batch": lambda size, source: _batch(size, source),
+    "buffer": lambda size, source: _buffer(size, source),
+}
+
+
+async def _reduce(fn: Callable, source: AsyncIterator):
+    iterator = source.__aiter__()
+    try:
+        value = await iterator.__anext__()
+    except StopAsyncIteration:
+        raise TypeError("reduce() of empty stream with no initial value") from None
+    async for element in iterator:
+        value = await _call(lambda x: fn(value, x), element)
+    return value
+
+
+async def _sum(_, source: AsyncIterator):
+    total = 0
+    async for element in source:
+        total += element
+    return total
+
+
+async def _find_first(fn: Callable, source: AsyncIterator):
+    async for element in source:
+        if await _call(fn, element):
+            return element
+    return None
+
+
+_AGGREGATIONS = {
+    "reduce": _reduce,
+    "sum": _sum,
+    "find_first": _find_first,
+}
+
+
+class AStream:
+    """
+    Asynchronous Stream: same fluent API of Stream over sync or async iterables.
+    Stage functions can be sync or async, map runs up to `concurrency` calls at once (keeping N requests
+    in flight), buffer prefetches the source in background, collectors are coroutines
+
+    Basic Usage:
+    >>> async def double(x):
+    ...     await asyncio.sleep(0.01)
+    ...     return x * 2
+    >>> asyncio.run(AStream(range(5)).map(double, concurrency=5).filter(lambda x: x > 2).to_list())
+    [4, 6, 8]
+    >>> asyncio.run(AStream(range(5)).map(double).sum().to_int())
+    20
+    >>> asyncio.run(AStream(range(5)).batch(2).to_list())
+    [[0, 1], [2, 3], [4]]
+
+    Async iterables sources
+    >>> async def pages():
+    ...     for page in range(3):
+    ...         yield [page] * 2
+    >>> asyncio.run(AStream(pages()).flat_map(lambda page: page).buffer(10).take(4).to_tuple())
+    (0, 0, 1, 1)
+
+    Unordered map yields the results as soon as they are ready
+    >>> async def wait(x):
+    ...     await asyncio.sleep(x / 100)
+    ...     return x
+    >>> asyncio.run(AStream([3, 1, 2]).map(wait, concurrency=3, ordered=False).to_list())
+    [1, 2, 3]
+
+    Stopping early (take, find_first) closes the upstream stages: no call is left in flight
+    >>> in_flight = []
+    >>> async def probe(x):
+    ...     in_flight.append(x)
+    ...     try:
+    ...         await asyncio.sleep(0.01)
+    ...         return x
+    ...     finally:
+    ...         in_flight.remove(x)
+    >>> async def first_two(ordered):
+    ...     results = await AStream(range(100)).map(probe, concurrency=5, ordered=ordered).buffer(3).take(2).to_list()
+    ...     await asyncio.sleep(0)  # calls left behind would start running here
+    ...     return len(results), len(in_flight)
+    >>> asyncio.run(first_two(ordered=True)), asyncio.run(first_two(ordered=False))
+    ((2, 0), (2, 0))
+    """
+
+    __slots__ = ("_iterable", "_stages")
+
+    def __init__(self, iterable: Union[Iterable, AsyncIterable] = None):
+        self._iterable = iterable
+        self._stages: tuple = ()
+
+    @classmethod
+    def of(cls, iterable: Union[Iterable, AsyncIterable], functions: Iterable):
+        instance = cls(iterable)
+        for processor, fn in functions:
+            instance = processor(instance, fn)
+        return instance
+
+    def _stage(self, op: str, arg=None) -> 'AStream':
+        stream = object.__new__(type(self))
+        stream._iterable, stream._stages = self._iterable, self._stages + ((op, arg),)
+        return stream
+
+    def over(self, iterable: Union[Iterable, AsyncIterable]) -> 'AStream':
+        """
+        Same plan over another source
+        """
+        stream = object.__new__(type(self))
+        stream._iterable, stream._stages = iterable, self._stages
+        return stream
+
+    async def _execute(self):
+        if self._iterable is None:
+            raise ValueError("AStream without source: bind it using over(iterable)")
+        value = _aiter(self._iterable)
+        for op, arg in self._stages:
+            if op in _STAGES:
+                value = _STAGES[op](arg, value)
+            else:
+                source = value
+                try:
+                    value = await _AGGREGATIONS[op](arg, source)
+                finally:
+                    await _aclose(source)
+        return value
+
+    async def _collect(self, fn: Callable):
+        value = await self._execute()
+        if hasattr(value, "__aiter__"):
+            source = value
+            try:
+                value = [element async for element in source]
+            finally:
+                await _aclose(source)
+        return fn(value)
+
+    def __aiter__(self):
+        async def iterate():
+            value = await self._execute()
+            try:
+                async for element in value:
+                    yield element
+            finally:
+                await _aclose(value)
+
+        return iterate()
+
+    # Public APIs
+    def map(self, fn: Callable, concurrency: int = 1, ordered: bool = True) -> 'AStream':
+        """
+        :param fn: sync or async function
+        :param concurrency: max number of calls in flight
+        :param ordered: keep the order of the source, otherwise yield the results as soon as they are ready
+        """
+        return self._stage("map", (fn, concurrency, ordered))
+
+    def flat_map(self, fn: Callable) -> 'AStream':
+        return self._stage("flat_map", fn)
+
+    def filter(self, fn: Callable) -> 'AStream':
+        return self._stage("filter", fn)
+
+    def take(self, limit: int) -> 'AStream':
+        return self._stage("take", limit)
+
+    def batch(self, size: int) -> 'AStream':
+        """
+        Group the elements in lists of size elements (the last one can be shorter)
+        """
+        return self._stage("batch", size)
+
+    def buffer(self, size: int) -> 'AStream':
+        """
+        Consume the upstream stages in background, at most size elements ahead of the consumer
+        """
+        return self._stage("buffer", size)
+
+    def reduce(self, fn: Callable) -> 'AStream':
+        return self._stage("reduce", fn)
+
+    def find_first(self, fn: Callable) -> 'AStream':
+        return self._stage("find_first", fn)
+
+    async def for_each(self, fn: Callable) -> None:
+        async for element in self:
+            await _call(fn, element)
+
+    # Collectors
+
+    def sum(self) -> 'AStream':
+        return self._stage("sum")
+
+    async def to_list(self) -> List:
+        return await self._collect(list)
+
+    async def to_int(self) -> int:
+        return await self._collect(int)
+
+    async def to_float(self) -> float:
+        return await self._collect(float)
+
+    async def to_decimal(self) -> Decimal:
+        return await self._collect(Decimal)
+
+    async def to_string(self) -> str:
+        return await self._collect(str)
+
+    async def to_tuple(self) -> tuple:
+        return await self._collect(tuple)
+
+    async def to_set(self) -> set:
+        return await self._collect(set)
+
+    async def to(self, fn: Callable):
+        return await self._collect(fn)
+
+
+if __name__ == "__main__":
+    import time
+
+
+    async def fetch(page):
+        await asyncio.sleep(0.01)  # simulated request
+        return page
+
+
+    async def main():
+        for concurrency in (1, 10, 50):
+            start = time.perf_counter()
+            await AStream(range(200)).map(fetch, concurrency=concurrency).to_list()
+            print(f"200 requests concurrency={concurrency:<3} {(time.perf_counter() - start) * 1e3:8.1f}ms")
+
+
+    asyncio.run(main())
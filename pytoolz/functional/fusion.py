@@ -0,0 +1,134 @@
+import functools
+from typing import Callable, Iterable, Iterator
+
+__all__ = ["fuse", "fuse_calls", "ELEMENT_STAGES"]
+
+ELEMENT_STAGES = frozenset(("map", "filter", "flat_map", "take"))
+
+# nested for loops allowed in a single fused function (CPython limits statically nested blocks to 20)
+_MAX_LOOPS = 16
+
+
+@functools.lru_cache(maxsize=256)
+def _compile(ops: tuple) -> Callable:
+    """
+    Generate (once per sequence of stage types) a generator function running all the stages in one loop:
+    maps are sequential assignments, filters are `continue` statements, flat_maps are nested loops,
+    takes are counters returning when the limit is reached
+    """
+    params = [f"a{index}" for index in range(len(ops))]
+    prologue, body, epilogue = [], [], []
+    indent = "    " * 2
+    last_loop = max((index for index, op in enumerate(ops) if op == "flat_map"), default=-1)
+    for index, op in enumerate(ops):
+        arg = params[index]
+        if op == "map":
+            body.append(f"{indent}x = {arg}(x)")
+        elif op == "filter":
+            body.append(f"{indent}if not {arg}(x):")
+            body.append(f"{indent}    continue")
+        elif op == "flat_map":
+            body.append(f"{indent}for x in {arg}(x):")
+            indent += "    "
+        elif op == "take":
+            prologue.append(f"    c{index} = 0")
+            prologue.append(f"    if {arg} <= 0:")
+            prologue.append(f"        return")
+            body.append(f"{indent}if c{index} >= {arg}:")
+            body.append(f"{indent}    return")
+            body.append(f"{indent}c{index} += 1")
+            if index > last_loop:
+                # no element can pass the stage anymore: stop without pulling the next one
+                epilogue.append(f"{indent}if c{index} >= {arg}:")
+                epilogue.append(f"{indent}    return")
+        else:
+            raise ValueError(f"Unknown stage: {op}")
+    body.append(f"{indent}yield x")
+
+    source = "\n".join([f"def fused(source, {', '.join(params)}):", *prologue,
+                        "    for x in source:", *body, *epilogue])
+    namespace = {}
+    exec(compile(source, f"<fused {' '.join(ops)}>", "exec"), namespace)
+    return namespace["fused"]
+
+
+def fuse(stages: Iterable[tuple]) -> Callable[[Iterable], Iterator]:
+    """
+    Fuse a sequence of (stage, argument) element stages ("map", "filter", "flat_map", "take")
+    into a single function iterating the source once, without nested generators or call layers per stage
+
+    Basic Usage:
+    >>> run = fuse([("map", lambda x: x + 1), ("filter", lambda x: x % 2), ("take", 2)])
+    >>> list(run(range(10)))
+    [1, 3]
+    >>> list(fuse([("flat_map", lambda x: (x, x)), ("map", str)])([1, 2]))
+    ['1', '1', '2', '2']
+
+    Stop as soon as the take limit is reached
+    >>> import itertools
+    >>> list(fuse([("map", lambda x: x * 2), ("take", 3)])(itertools.count()))
+    [0, 2, 4]
+
+    :param stages: iterable of (stage, argument) tuples, argument is a function or the take limit
+    :return: function taking the source iterable and returning the output iterator
+    """
+    stages = tuple(stages)
+    if not stages:
+        return iter
+    if len(stages) == 1 and stages[0][0] in ("map", "filter"):
+        # builtins iterate in C, faster than a generator for a single stage
+        op, fn = stages[0]
+        return functools.partial(map if op == "map" else filter, fn)
+
+    # split very long chains of flat_maps, each chunk feeds the next one
+    chunks, chunk, loops = [], [], 0
+    for stage in stages:
+        if stage[0] == "flat_map":
+            if loops == _MAX_LOOPS:
+                chunks.append(chunk)
+                chunk, loops = [], 0
+            loops += 1
+        chunk.append(stage)
+    chunks.append(chunk)
+
+    compiled = [(_compile(tuple(op for op, _ in chunk)), tuple(arg for _, arg in chunk)) for chunk in chunks]
+    if len(compiled) == 1:
+        fused, args = compiled[0]
+        return lambda source: fused(source, *args)
+
+    def run(source):
+        for fused, args in compiled:
+            source = fused(source, *args)
+        return source
+
+    return run
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_calls(count: int) -> Callable:
+    params = [f"a{index}" for index in range(count)]
+    source = "\n".join([f"def fused(x, {', '.join(params)}):", *(f"    x = {arg}(x)" for arg in params),
+                        "    return x"])
+    namespace = {}
+    exec(compile(source, f"<fused calls {count}>", "exec"), namespace)
+    return namespace["fused"]
+
+
+def fuse_calls(functions: Iterable[Callable]) -> Callable:
+    """
+    Fuse a sequence of functions, applied from the first to the last, into a single function
+    calling them in straight line code (no loop, no nested lambdas)
+
+    >>> fuse_calls([lambda x: x + 1, lambda x: x * 10])(1)
+    20
+
+    :param functions: iterable of functions
+    :return: function of one argument
+    """
+    functions = tuple(functions)
+    if not functions:
+        return lambda x: x
+    if len(functions) == 1:
+        return functions[0]
+    fused = _compile_calls(len(functions))
+    return lambda x: fused(x, *functions)
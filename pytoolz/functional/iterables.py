@@ -1,15 +1,25 @@
+import array
+import threading
+import tracemalloc
 from decimal import Decimal
 from functools import reduce, partial
+from itertools import chain
 from typing import Callable, Iterable, List
 
-from pytoolz.functional.pipe import compose
+from pytoolz.functional.fusion import ELEMENT_STAGES, fuse
+from pytoolz.functional.profiling import StageStats, describe_stage, instrument, metered
+from pytoolz.functional.vectorized import np, is_array_source, execute_vectorized, vectorized_prefix
+from pytoolz.functional.windowing import batch, window, group_by, distinct, external_sorted
+from pytoolz.multiprocessing.pool import chunked, imap_chunks
 
-__all__ = ["flat_map", "iflat_map", "for_each", "Stream"]
+__all__ = ["flat_map", "iflat_map", "flat_map_chunks", "for_each", "Stream"]
+
+_ATOMS = (str, bytes, bytearray)  # iterables never flattened by iflat_map
 
 
 def flat_map(fn: Callable, collection: Iterable):
     """
-    Apply the input function to every element in iterable and flatten the result list
+    Apply the input function to every element in iterable and flatten the result list (linear time)
     :param fn: map function
     :param collection: input iterable
     :return: flattened collection
@@ -19,25 +29,79 @@ def flat_map(fn: Callable, collection: Iterable):
     >>> flat_map(lambda x: (x, x),[1,2,3])
     [1, 1, 2, 2, 3, 3]
     """
+    # list.extend grows the result in place (amortized O(1)), faster than preallocating from the result sizes
+    flattened = []
+    extend = flattened.extend
+    for result in map(fn, collection):
+        extend(result)
+    return flattened
+
 
-    return reduce(lambda acc, x: acc + [y for y in x], map(fn, collection), [])
+def _flatten(iterable: Iterable, depth: int):
+    """
+    Flatten nested iterables (strings and bytes excluded) up to depth levels, iteratively
+    """
+    stack = [iter(iterable)]
+    while stack:
+        for element in stack[-1]:
+            if len(stack) <= depth and isinstance(element, Iterable) and not isinstance(element, _ATOMS):
+                stack.append(iter(element))
+                break
+            yield element
+        else:
+            stack.pop()
 
 
-def iflat_map(fn: Callable, collection: Iterable):
+def iflat_map(fn: Callable, collection: Iterable, depth: int = 1):
     """
     Apply the input function to every element in iterable and flatten the result list lazily
     :param fn: map function
     :param collection: input iterable
+    :param depth: number of nested levels flattened, None flattens every level (strings and bytes are not flattened)
     :return: flattened collection
 
     >>> list(iflat_map(lambda x: [x, x],[1,2,3]))
     [1, 1, 2, 2, 3, 3]
     >>> list(iflat_map(lambda x: (x, x),[1,2,3]))
     [1, 1, 2, 2, 3, 3]
+    >>> list(iflat_map(lambda x: [x, [x, [x]]], [1, 2], depth=2))
+    [1, 1, [1], 2, 2, [2]]
+    >>> list(iflat_map(lambda x: [x, [x, [x]]], [1, 2], depth=None))
+    [1, 1, 1, 2, 2, 2]
     """
+    if depth == 1:
+        return chain.from_iterable(map(fn, collection))
+    return _flatten(map(fn, collection), float("inf") if depth is None else depth)
+
+
+def flat_map_chunks(fn: Callable, collection: Iterable, size: int, typecode: str = None):
+    """
+    Apply the input function to every element in iterable and yield the flattened result in contiguous
+    buffers of size elements (the last one can be shorter): lists, or array.array of the typecode
+    :param fn: map function
+    :param collection: input iterable
+    :param size: number of elements of a buffer
+    :param typecode: array.array typecode of the buffers, lists if None
+    :return: iterator of buffers
+
+    >>> list(flat_map_chunks(lambda x: [x, x], [1, 2, 3], 4))
+    [[1, 1, 2, 2], [3, 3]]
+    >>> next(flat_map_chunks(lambda x: [x, x], [1, 2, 3], 4, typecode="d"))
+    array('d', [1.0, 1.0, 2.0, 2.0])
+    """
+    if size < 1:
+        raise ValueError(f"Invalid chunk size: {size}")
+    new = list if typecode is None else partial(array.array, typecode)
+    buffer = new()
     for result in map(fn, collection):
-        for element in result:
-            yield element
+        buffer.extend(result)
+        start = 0
+        while len(buffer) - start >= size:
+            yield buffer[start:start + size]
+            start += size
+        del buffer[:start]
+    if buffer:
+        yield buffer
 
 
 def for_each(fn: Callable, collection: Iterable):
@@ -56,8 +120,74 @@ def for_each(fn: Callable, collection: Iterable):
         fn(x)
 
 
+# stages transforming the whole iterator (stateful, not fused)
+_TRANSFORMS = {
+    "batch": lambda size, iterable: batch(iterable, size),
+    "window": lambda args, iterable: window(iterable, *args),
+    "group_by": lambda args, iterable: group_by(iterable, *args),
+    "distinct": lambda args, iterable: distinct(iterable, *args),
+    "sorted": lambda args, iterable: external_sorted(iterable, *args),
+}
+
+# aggregations whose partial results (computed per chunk) can be combined with the same function
+_ASSOCIATIVE = {
+    "reduce": lambda fn, partials: reduce(fn, partials),
+    "sum": lambda _, partials: sum(partials),
+}
+
+_AGGREGATIONS = {
+    "reduce": lambda fn, iterable: reduce(fn, iterable),
+    "sum": lambda _, iterable: sum(iterable),
+    "find_first": lambda fn, iterable: next(filter(fn, iterable), None),
+}
+
+
+class _Cache:
+    """
+    Materialized output of the stages preceding a Stream.cache() stage, shared by the streams derived from it.
+    It is bound to the last source it has been computed for, pickled empty
+    """
+    __slots__ = ("source", "value", "_lock")
+
+    def __init__(self):
+        self.source = self.value = None
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        return _Cache, ()
+
+    def hit(self, source) -> bool:
+        return self.source is source and source is not None
+
+    def store(self, source, value):
+        if hasattr(value, "__next__"):
+            value = list(value)
+        with self._lock:
+            self.source, self.value = source, value
+        return value
+
+
+def _run_chunk(stages: tuple, aggregation, chunk: list) -> list:
+    """
+    Run the fused element stages (and the partial aggregation) of a parallel Stream on a chunk,
+    module level to be picklable
+    """
+    result = fuse(stages)(chunk)
+    if aggregation is None:
+        return list(result)
+    op, arg = aggregation
+    result = list(result)
+    if op == "reduce":
+        return [reduce(arg, result)] if result else []
+    return [_AGGREGATIONS[op](arg, result)]
+
+
 class Stream:
     """
+    Lazy stream: every stage is recorded in a plan, adjacent map/filter/flat_map/take stages are fused
+    and executed in a single loop (see pytoolz.functional.fusion) only when a collector is called.
+    take and find_first stop consuming the source as soon as they are satisfied
+
     Basic Usage:
     >>> Stream([1,2,3]).map(lambda x: x*3).to_list()
     [3, 6, 9]
@@ -76,6 +206,64 @@ class Stream:
         .sum()\
         .to_float()
     101.0
+    >>> import itertools
+    >>> Stream(itertools.count()).map(lambda x: x * x).find_first(lambda x: x > 50).to_int()
+    64
+
+    Parallel execution: the leading map/filter/flat_map stages run on a pool of workers over chunks of the source,
+    sum and reduce (associative functions) combine the partial results of the chunks
+    >>> Stream(range(10)).parallel(workers=2, backend="thread", chunksize=3).map(lambda x: x * 2).to_list()
+    [0, 2, 4, 6, 8, 10, 12, 14, 16, 18]
+    >>> Stream(range(1000)).parallel(workers=2, chunksize=100).map(abs).sum().to_int()
+    499500
+
+    Batching, windowing, grouping, deduplication and sorting stages are lazy and memory bounded
+    >>> Stream(range(7)).batch(3).to_list()
+    [[0, 1, 2], [3, 4, 5], [6]]
+    >>> Stream(range(5)).window(2).map(sum).to_list()
+    [1, 3, 5, 7]
+    >>> Stream([3, 1, 3, 2, 1]).distinct().sorted().to_list()
+    [1, 2, 3]
+    >>> Stream(["apple", "avocado", "banana"]).group_by(lambda x: x[0]).to(dict)
+    {'a': ['apple', 'avocado'], 'b': ['banana']}
+
+    Array sources (numpy arrays, typed buffers) run ufuncs, vectorized functions, take and sum as array
+    operations, falling back to element by element execution from the first unsupported stage
+    >>> import numpy as np
+    >>> from pytoolz.functional.vectorized import vectorized
+    >>> Stream(np.arange(10)).map(np.square).filter(vectorized(lambda x: x % 2 == 0)).take(3).to_array()
+    array([ 0,  4, 16])
+    >>> Stream(np.arange(10)).map(np.square).map(lambda x: x + 1).to_list()
+    [1, 2, 5, 10, 17, 26, 37, 50, 65, 82]
+
+    Streams are immutable plans: every stage returns a new Stream, a plan built once (with or without a source)
+    can be run over many sources, compared, hashed and pickled (when its functions are picklable)
+    >>> squares = Stream().map(lambda x: x * x)
+    >>> squares.over([1, 2]).to_list(), squares.over(range(4)).sum().to_int()
+    ([1, 4], 14)
+    >>> import pickle
+    >>> plan = Stream().map(abs).take(2).sum()
+    >>> plan, pickle.loads(pickle.dumps(plan)) == plan
+    (Stream(map(abs).take(2).sum()), True)
+
+    cache() materializes the output of the preceding stages once for the streams derived from it
+    >>> calls = []
+    >>> parsed = Stream(["1", "2", "3"]).map(lambda x: calls.append(x) or int(x)).cache()
+    >>> parsed.sum().to_int(), parsed.filter(lambda x: x > 1).to_list(), len(calls)
+    (6, [2, 3], 3)
+
+    explain() describes the execution of the plan, profile() reports elements in/out and time of every stage
+    >>> print(Stream(range(10)).map(abs).filter(lambda x: x % 2).batch(2).sum().explain())
+    Stream(map(abs).filter(<lambda>).batch(2).sum())
+      source: range
+      fused loop: map(abs) -> filter(<lambda>)
+      transformation: batch(2)
+      aggregation: sum()
+    >>> reports = []
+    >>> Stream(range(10)).map(abs).filter(lambda x: x % 2).take(3).profile(lambda msg, rows: reports.append(rows)).to_list()
+    [1, 3, 5]
+    >>> [(row["stage"], row["in"], row["out"]) for row in reports[0]]
+    [('source', None, 6), ('map(abs)', 6, 6), ('filter(<lambda>)', 6, 3), ('take(3)', 3, 3), ('collect(list)', 3, 1)]
 
     Alternative constructor
     >>> Stream.of([1,2,3], [
@@ -85,60 +273,274 @@ class Stream:
     [9, 18, 27]
     """
 
-    def __init__(self, iterable: Iterable):
+    __slots__ = ("_iterable", "_stages", "_parallel", "_profile")
+
+    def __init__(self, iterable: Iterable = None):
         self._iterable: Iterable = iterable
-        self.processor: Callable = lambda x: x
+        self._stages: tuple = ()
+        self._parallel: tuple = None
+        self._profile: tuple = None
 
     @classmethod
     def of(cls, iterable: Iterable, functions: Iterable):
         instance = cls(iterable)
         for processor, fn in functions:
-            processor(instance, fn)
+            instance = processor(instance, fn)
         return instance
 
+    def _derive(self, **changes) -> 'Stream':
+        stream = object.__new__(type(self))
+        for name in Stream.__slots__:
+            setattr(stream, name, changes.get(name, getattr(self, name)))
+        return stream
+
+    def _stage(self, op: str, arg=None) -> 'Stream':
+        return self._derive(_stages=self._stages + ((op, arg),))
+
+    def over(self, iterable: Iterable) -> 'Stream':
+        """
+        Same plan over another source
+        """
+        return self._derive(_iterable=iterable)
+
+    def __eq__(self, other):
+        """
+        Streams are equal when their plans (stages and parallel options) are, the source is not part of the plan
+        """
+        return type(self) is type(other) and (self._stages, self._parallel) == (other._stages, other._parallel)
+
+    def __hash__(self):
+        return hash((self._stages, self._parallel))
+
+    def __repr__(self):
+        return f"Stream({'.'.join(describe_stage(op, arg) for op, arg in self._stages)})"
+
+    def _execute_parallel(self, stages: list):
+        """
+        Run the leading map/filter/flat_map stages (and a following sum/reduce) on the pool,
+        return the output and the stages left to run locally
+        """
+        count = next((index for index, (op, _) in enumerate(stages) if op not in ("map", "filter", "flat_map")),
+                     len(stages))
+        aggregation = None
+        if count < len(stages) and stages[count][0] in _ASSOCIATIVE:
+            aggregation = stages[count]
+
+        workers, backend, chunksize, ordered = self._parallel
+        results = imap_chunks(partial(_run_chunk, tuple(stages[:count]), aggregation),
+                              chunked(self._iterable, chunksize), workers=workers,
+                              backend=backend, ordered=ordered or aggregation is not None)
+        if aggregation is None:
+            return chain.from_iterable(results), stages[count:]
+        op, arg = aggregation
+        return _ASSOCIATIVE[op](arg, chain.from_iterable(results)), stages[count + 1:]
+
+    def _apply(self, op: str, arg, value):
+        """
+        Run a transformation or an aggregation stage
+        """
+        if op == "cache":
+            return arg.store(self._iterable, value)
+        if op == "apply":
+            return arg(value)
+        return (_TRANSFORMS.get(op) or _AGGREGATIONS[op])(arg, value)
+
+    def _run(self, value, stages):
+        """
+        Fuse every run of element stages, apply the transformations and the aggregations in between
+        """
+        pending = []
+        for op, arg in stages:
+            if op in ELEMENT_STAGES:
+                pending.append((op, arg))
+                continue
+            if pending:
+                value, pending = fuse(pending)(value), []
+            value = self._apply(op, arg, value)
+        return fuse(pending)(value) if pending else value
+
+    def _execute(self):
+        """
+        Run the plan: start from the last cached stage, or on a pool, or as array operations,
+        the remaining stages run locally
+        """
+        if self._iterable is None:
+            raise ValueError("Stream without source: bind it using over(iterable)")
+        value, stages = self._iterable, self._stages
+        cached = next((index for index in reversed(range(len(stages)))
+                       if stages[index][0] == "cache" and stages[index][1].hit(value)), None)
+        if cached is not None:
+            value, stages = stages[cached][1].value, stages[cached + 1:]
+        elif self._parallel is not None:
+            value, stages = self._execute_parallel(stages)
+        elif is_array_source(value):
+            value, stages = execute_vectorized(value, stages)
+        return self._run(value, stages)
+
+    def _collect_profiled(self, fn: Callable):
+        """
+        Run the plan locally (no pool, no array operations) measuring every stage, then log the report
+        """
+        if self._iterable is None:
+            raise ValueError("Stream without source: bind it using over(iterable)")
+        log_fn, memory = self._profile
+        tracing = memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        try:
+            source, stages, profiles = instrument(self._iterable, self._stages, ELEMENT_STAGES,
+                                                  self._apply, memory)
+            collector = StageStats(f"collect({getattr(fn, '__qualname__', repr(fn))})", memory)
+            value = self._run(source, stages)
+            started = collector.clock()
+            result = fn(metered(value, collector, "elements_in", sign=-1) if hasattr(value, "__next__") else value)
+            collector.add(started)
+            collector.elements_out = 1
+        finally:
+            if tracing:
+                tracemalloc.stop()
+        rows = [stats.row() for stats in profiles + [collector]]
+        # imported here: importing pytoolz.log configures the logging module (root logger)
+        from pytoolz.log.logperf import log_perf_report
+        log_perf_report(f"profile {self!r}", rows, **({"log_fn": log_fn} if log_fn else {}))
+        return result
+
     def _collect(self, fn: Callable):
-        obj = fn(self.processor(self._iterable))
-        return obj
+        if self._profile is not None:
+            return self._collect_profiled(fn)
+        value = self._execute()
+        if np is not None and isinstance(value, np.ndarray) and fn in (list, tuple, set):
+            # python scalars, converted in C
+            value = value.tolist()
+        return fn(value)
 
     # Public APIs
+    def parallel(self, workers: int = None, backend: str = "process", chunksize: int = 1024,
+                 ordered: bool = True) -> 'Stream':
+        """
+        Run the leading map/filter/flat_map stages on a pool of workers (see pytoolz.multiprocessing.pool).
+        The process backend requires picklable (module level) functions, use the thread backend for lambdas
+        or for functions releasing the GIL
+
+        :param workers: number of workers, by default the number of CPUs
+        :param backend: "process" or "thread"
+        :param chunksize: number of elements sent to a worker at once
+        :param ordered: keep the order of the source, otherwise yield the chunks as soon as they are ready
+        """
+        return self._derive(_parallel=(workers, backend, chunksize, ordered))
+
+    def profile(self, log_fn: Callable = None, memory: bool = False) -> 'Stream':
+        """
+        Profile the next collections: every stage reports elements in, elements out, time spent (upstream stages
+        excluded) and, if memory is True, net memory allocated (tracemalloc), through pytoolz.log.log_perf_report.
+        Profiled plans run locally, element by element
+
+        :param log_fn: log function receiving the report title and rows, by default the table is printed
+        :param memory: trace memory allocations (slower)
+        """
+        return self._derive(_profile=(log_fn, memory))
+
+    def explain(self) -> str:
+        """
+        Describe how the plan is executed: the fused loops, the transformations and aggregations between them,
+        the stages run on a pool or as array operations
+        """
+        lines = [repr(self), f"  source: {type(self._iterable).__name__}"]
+        stages = list(self._stages)
+        if self._parallel is not None:
+            workers, backend, chunksize, ordered = self._parallel
+            count = next((index for index, (op, _) in enumerate(stages) if op not in ("map", "filter", "flat_map")),
+                         len(stages))
+            if count < len(stages) and stages[count][0] in _ASSOCIATIVE:
+                count += 1
+            lines.append(f"  parallel({backend}, workers={workers or 'cpus'}, chunksize={chunksize}, ordered={ordered}): "
+                         f"{' -> '.join(describe_stage(*stage) for stage in stages[:count])}")
+            stages = stages[count:]
+        elif is_array_source(self._iterable):
+            count = vectorized_prefix(self._iterable, stages)
+            if count:
+                lines.append(f"  array operations: {' -> '.join(describe_stage(*stage) for stage in stages[:count])}")
+            stages = stages[count:]
+
+        pending = []
+        for op, arg in stages + [(None, None)]:
+            if op in ELEMENT_STAGES:
+                pending.append(describe_stage(op, arg))
+                continue
+            if pending:
+                lines.append(f"  fused loop: {' -> '.join(pending)}")
+                pending = []
+            if op is not None:
+                kind = "aggregation" if op in _AGGREGATIONS else "transformation"
+                lines.append(f"  {kind}: {describe_stage(op, arg)}")
+        return "\n".join(lines)
+
+    def cache(self) -> 'Stream':
+        """
+        Materialize the output of the preceding stages the first time one of the derived streams is collected,
+        the next collections (of any stream derived from this one, over the same source) start from it
+        """
+        return self._stage("cache", _Cache())
+
     def map(self, fn: Callable) -> 'Stream':
-        self.processor = compose(partial(map, fn), self.processor)
-        return self
+        return self._stage("map", fn)
 
     def flat_map(self, fn: Callable) -> 'Stream':
-        self.processor = compose(partial(iflat_map, fn), self.processor)
-        return self
+        return self._stage("flat_map", fn)
 
     def filter(self, fn: Callable) -> 'Stream':
-        self.processor = compose(partial(filter, fn), self.processor)
-        return self
+        return self._stage("filter", fn)
 
     def reduce(self, fn: Callable) -> 'Stream':
-        self.processor = compose(partial(reduce, fn), self.processor)
-        return self
+        return self._stage("reduce", fn)
+
+    def batch(self, size: int) -> 'Stream':
+        """
+        Group the elements in lists of size elements (the last one can be shorter)
+        """
+        return self._stage("batch", size)
+
+    def window(self, size: int, step: int = 1) -> 'Stream':
+        """
+        Sliding windows (tuples) of size elements, a window every step elements
+        """
+        return self._stage("window", (size, step))
+
+    def group_by(self, key: Callable, consecutive: bool = False) -> 'Stream':
+        """
+        (key, list of elements) groups, consecutive groups only the runs of equal keys (constant memory)
+        """
+        return self._stage("group_by", (key, consecutive))
+
+    def distinct(self, key: Callable = None, approximate: bool = False, capacity: int = 1000000,
+                 error_rate: float = 0.001) -> 'Stream':
+        """
+        Drop duplicated elements, approximate uses a bloom filter (constant memory, see windowing.distinct)
+        """
+        return self._stage("distinct", (key, approximate, capacity, error_rate))
+
+    def sorted(self, key: Callable = None, reverse: bool = False, buffer_size: int = 100000) -> 'Stream':
+        """
+        Sort keeping at most buffer_size elements in memory, spilling sorted runs to disk (external merge sort)
+        """
+        return self._stage("sorted", (key, reverse, buffer_size))
 
     def find_first(self, fn: Callable) -> 'Stream':
-        self.processor = compose(partial(reduce, fn), self.processor)
-        return self
+        """
+        First element matching the predicate (None if there is no match)
+        """
+        return self._stage("find_first", fn)
 
     def for_each(self, fn: Callable) -> None:
-        self.processor = compose(partial(for_each, fn), self.processor)
+        self._collect(partial(for_each, fn))
 
     def take(self, limit: int) -> 'Stream':
-        def fn(collection):
-            for index, element in enumerate(collection):
-                if index >= limit:
-                    break
-                yield element
-
-        self.processor = compose(fn, self.processor)
-        return self
+        return self._stage("take", limit)
 
     # Collectors
 
     def sum(self) -> 'Stream':
-        self.processor = compose(sum, self.processor)
-        return self
+        return self._stage("sum")
 
     def to_list(self) -> List:
         return self._collect(list)
@@ -164,7 +566,91 @@ class Stream:
     def to(self, fn: Callable):
         return self._collect(fn)
 
-if __name__ == "__main__":
-    import doctest
+    def to_array(self):
+        """
+        Collect the elements in a numpy array (array sources are returned without copies)
+        """
+        if np is None:
+            raise ImportError("to_array requires numpy")
+        return self._collect(lambda value: value if isinstance(value, np.ndarray) else np.asarray(list(value)))
 
-    doctest.testmod()
+
+if __name__ == "__main__":
+    import timeit
+
+    from pytoolz.functional.pipe import compose
+
+
+    class LegacyStream:
+        """
+        Previous implementation: every stage composes the processor with a new lambda
+        """
+
+        def __init__(self, iterable):
+            self._iterable = iterable
+            self.processor = lambda x: x
+
+        def map(self, fn):
+            self.processor = compose(partial(map, fn), self.processor)
+            return self
+
+        def filter(self, fn):
+            self.processor = compose(partial(filter, fn), self.processor)
+            return self
+
+        def to_list(self):
+            return list(self.processor(self._iterable))
+
+
+    def legacy_flat_map(fn, collection):
+        return reduce(lambda acc, x: acc + [y for y in x], map(fn, collection), [])
+
+    for size in (1000, 10000, 50000):
+        collection = range(size)
+        legacy = timeit.timeit(lambda: legacy_flat_map(lambda x: (x, x), collection), number=1)
+        linear = timeit.timeit(lambda: flat_map(lambda x: (x, x), collection), number=1)
+        chunks = timeit.timeit(lambda: list(flat_map_chunks(lambda x: (x, x), collection, 1024)), number=1)
+        print(f"flat_map {size:>6} elements  reduce: {legacy * 1e3:9.1f}ms  linear: {linear * 1e3:6.1f}ms  "
+              f"chunks: {chunks * 1e3:6.1f}ms")
+
+    data = list(range(100000))
+    inc, double, odd = (lambda x: x + 1), (lambda x: x * 2), (lambda x: x % 3)
+
+    def build(stream, length):
+        for _ in range(length):
+            stream = stream.map(inc).filter(odd).map(double)
+        return stream
+
+    for length in (1, 3, 10, 100):
+        number = max(1, 30 // length)
+        fused = timeit.timeit(lambda: build(Stream(data), length).to_list(), number=number) / number
+        legacy = timeit.timeit(lambda: build(LegacyStream(data), length).to_list(), number=number) / number
+        generator = f"(double(x) for x in (inc(x) for x in data) if odd(x))"
+        for _ in range(length - 1):
+            generator = f"(double(x) for x in (inc(x) for x in {generator}) if odd(x))"
+        try:
+            code = compile(f"list({generator})", "<generators>", "eval")
+            expressions = f"{timeit.timeit(lambda: eval(code), number=number) / number * 1e3:8.1f}ms"
+        except SyntaxError:
+            expressions = "too many nested parentheses"
+        print(f"{length * 3:>4} stages  fused: {fused * 1e3:8.1f}ms  legacy: {legacy * 1e3:8.1f}ms  "
+              f"generator expressions: {expressions}")
+
+    for name, stream in (("fused", Stream), ("legacy", LegacyStream)):
+        try:
+            build(stream(range(10)), 2000).to_list()
+            print(f"6000 stages {name}: ok")
+        except RecursionError:
+            print(f"6000 stages {name}: RecursionError")
+
+    def collatz(number):
+        steps = 0
+        while number > 1:
+            number = number // 2 if number % 2 == 0 else 3 * number + 1
+            steps += 1
+        return steps
+
+    for name, stream in (("sequential", lambda: Stream(range(1, 300000))),
+                         ("parallel(process)", lambda: Stream(range(1, 300000)).parallel(chunksize=10000))):
+        elapsed = timeit.timeit(lambda: stream().map(collatz).sum().to_int(), number=1)
+        print(f"collatz steps sum {name:<18} {elapsed * 1e3:8.1f}ms")
@@ -1,28 +1,34 @@
-from typing import Callable, List
+from typing import Callable, Iterable, Iterator, List
 
-__all__ = ["compose", "pipe"]
+from pytoolz.functional.fusion import fuse, fuse_calls
 
+__all__ = ["compose", "pipe", "Pipeline"]
 
-def compose(f1: Callable, f2: Callable) -> Callable:
+
+def compose(*functions: Callable) -> Callable:
     """
-    Compose two functions: return the fn composition of the two
+    Compose functions: return the fn composition of them, applied from the last to the first
 
     Basic Usage:
     >>> f = compose(lambda x: x * 2,
     ...             lambda x: x * 3)
     >>> f(10)
     60
+    >>> compose(str, abs, lambda x: x - 10)(3)
+    '7'
 
-    :param f1: function 1
-    :param f2: function 2
+    :param functions: functions
     :return:
     """
-    return lambda x: f1(f2(x))
+    if len(functions) == 2:
+        f1, f2 = functions
+        return lambda x: f1(f2(x))
+    return Pipeline(*reversed(functions))
 
 
 def pipe(functions: List[Callable], obj):
     """
-    Recursively apply a list of morphism to an input value
+    Apply a list of morphism to an input value, from the first to the last
 
     Basic Usage:
     >>> pipe([lambda x: x * 3,
@@ -34,7 +40,92 @@ def pipe(functions: List[Callable], obj):
     :param obj: value
     :return: transformed value
     """
-    if not functions:
-        return obj
+    for function in functions:
+        obj = function(obj)
+    return obj
+
+
+class Pipeline:
+    """
+    Precompiled pipeline of functions applied from the first to the last: stages are validated and
+    flattened (nested pipelines) once, then fused in straight line code run in a tight loop.
+    Pipelines are immutable, hashable and picklable (when their functions are)
+
+    Basic Usage:
+    >>> normalize = Pipeline(str.strip, str.lower)
+    >>> normalize("  Foo ")
+    'foo'
+    >>> list(normalize.map_over(["A ", " b"]))
+    ['a', 'b']
+    >>> Pipeline(normalize, len)("  Foo ")
+    3
+    >>> normalize.then(str.upper).stages
+    (<method 'strip' of 'str' objects>, <method 'lower' of 'str' objects>, <method 'upper' of 'str' objects>)
+
+    :param stages: functions or pipelines
+    """
+    __slots__ = ("stages", "_call", "_map")
+
+    def __init__(self, *stages: Callable):
+        flattened = []
+        for stage in stages:
+            if isinstance(stage, Pipeline):
+                flattened.extend(stage.stages)
+            elif callable(stage):
+                flattened.append(stage)
+            else:
+                raise TypeError(f"Pipeline stage {stage!r} is not callable")
+        self.stages = tuple(flattened)
+        self._call = fuse_calls(self.stages)
+        self._map = fuse([("map", stage) for stage in self.stages]) if self.stages else iter
+
+    def __call__(self, obj):
+        return self._call(obj)
+
+    def map_over(self, iterable: Iterable) -> Iterator:
+        """
+        Lazily apply the pipeline to every element of the iterable (single fused loop)
+        """
+        return self._map(iterable)
+
+    def then(self, *stages: Callable) -> 'Pipeline':
+        """
+        New pipeline running the stages after the ones of this pipeline
+        """
+        return Pipeline(self, *stages)
+
+    def __len__(self):
+        return len(self.stages)
+
+    def __eq__(self, other):
+        return isinstance(other, Pipeline) and self.stages == other.stages
+
+    def __hash__(self):
+        return hash(self.stages)
+
+    def __reduce__(self):
+        return Pipeline, self.stages
+
+    def __repr__(self):
+        return f"Pipeline({', '.join(getattr(stage, '__qualname__', repr(stage)) for stage in self.stages)})"
+
+
+if __name__ == "__main__":
+    import timeit
+
+    functions = [lambda x: x + 1] * 100
+    data = list(range(10000))
+    pipeline = Pipeline(*functions)
+    try:
+        pipe([lambda x: x] * 5000, 1)
+        print("pipe 5000 functions: ok")
+    except RecursionError:
+        print("pipe 5000 functions: RecursionError")
 
-    return pipe(functions[1:], functions[0](obj))
+    cases = {
+        "compose(*functions)": lambda: list(map(compose(*([lambda x: x + 1] * 100)), data)),
+        "pipe": lambda: [pipe(functions, x) for x in data],
+        "Pipeline.map_over": lambda: list(pipeline.map_over(data)),
+    }
+    for name, case in cases.items():
+        print(f"100 functions x 10000 elements {name:<18} {timeit.timeit(case, number=3) / 3 * 1e3:8.1f}ms")
@@ -0,0 +1,143 @@
+import time
+import tracemalloc
+from typing import Callable, Iterable, List
+
+__all__ = ["StageStats", "describe_stage", "instrument", "metered"]
+
+
+def describe_stage(op: str, arg=None) -> str:
+    """
+    Short description of a plan stage
+
+    >>> describe_stage("map", abs), describe_stage("take", 3), describe_stage("sum")
+    ('map(abs)', 'take(3)', 'sum()')
+    """
+    if callable(arg):
+        description = getattr(arg, "__qualname__", repr(arg))
+    elif isinstance(arg, tuple):
+        description = ", ".join(getattr(value, "__qualname__", repr(value)) for value in arg)
+    else:
+        description = "" if arg is None or op == "cache" else repr(arg)
+    return f"{op}({description})"
+
+
+class StageStats:
+    """
+    Profile of a stage: elements in and out, time spent and memory allocated (net, traced by tracemalloc)
+    by the stage itself, upstream stages excluded
+    """
+    __slots__ = ("stage", "elements_in", "elements_out", "seconds", "memory")
+
+    def __init__(self, stage: str, memory: bool = False):
+        self.stage = stage
+        self.elements_in = self.elements_out = 0
+        self.seconds = 0.0
+        self.memory = 0 if memory else None
+
+    def clock(self) -> tuple:
+        return time.perf_counter(), 0 if self.memory is None else tracemalloc.get_traced_memory()[0]
+
+    def add(self, started: tuple, sign: int = 1):
+        """
+        Add (sign=-1: remove) the time and the memory allocated since the started clock
+        """
+        self.seconds += sign * (time.perf_counter() - started[0])
+        if self.memory is not None:
+            self.memory += sign * (tracemalloc.get_traced_memory()[0] - started[1])
+
+    def row(self) -> dict:
+        return {"stage": self.stage, "in": self.elements_in, "out": self.elements_out,
+                "seconds": self.seconds, "memory": self.memory}
+
+
+def _timed(fn: Callable, stats: StageStats, count: Callable) -> Callable:
+    """
+    Wrap an element stage function, count(result) is the number of elements produced by a call
+    """
+    def stage(element):
+        started = stats.clock()
+        result = fn(element)
+        stats.add(started)
+        stats.elements_in += 1
+        stats.elements_out += count(result)
+        return result
+
+    return stage
+
+
+def metered(iterable: Iterable, stats: StageStats, counter: str, sign: int = 1):
+    """
+    Yield the elements of the iterable counting them (counter attribute of stats) and adding (sign=-1: removing)
+    the time spent producing them to stats
+    """
+    iterator = iter(iterable)
+    while True:
+        started = stats.clock()
+        try:
+            element = next(iterator)
+        except StopIteration:
+            stats.add(started, sign)
+            return
+        stats.add(started, sign)
+        setattr(stats, counter, getattr(stats, counter) + 1)
+        yield element
+
+
+def _timed_apply(op: str, arg, apply: Callable, stats: StageStats) -> Callable:
+    """
+    Wrap a transformation (iterator in, iterator out) or an aggregation (iterator in, value out):
+    the time spent pulling the input is removed from the time spent producing the output
+    """
+    def stage(value):
+        started = stats.clock()
+        result = apply(op, arg, metered(value, stats, "elements_in", sign=-1))
+        stats.add(started)
+        if hasattr(result, "__next__"):
+            return metered(result, stats, "elements_out")
+        stats.elements_out += 1
+        return result
+
+    return stage
+
+
+def instrument(source: Iterable, stages: tuple, element_stages: frozenset, apply: Callable,
+               memory: bool = False):
+    """
+    Instrument a plan: element stages functions are wrapped to count and time their calls, take stages are preceded
+    by a counter, transformations and aggregations become "apply" stages measuring their own time.
+    The instrumented plan runs element by element, without fusion across the profiled stages
+
+    :param source: plan source
+    :param stages: tuple of (stage, argument)
+    :param element_stages: names of the element stages
+    :param apply: function (stage, argument, value) -> value running a transformation or an aggregation
+    :param memory: trace memory allocations (tracemalloc must be tracing)
+    :return: the counted source, the instrumented stages and the list of StageStats (source first)
+    """
+    source_stats = StageStats("source", memory)
+    source_stats.elements_in = None
+    profiles: List[StageStats] = [source_stats]
+    instrumented = []
+    for op, arg in stages:
+        stats = StageStats(describe_stage(op, arg), memory)
+        profiles.append(stats)
+        if op == "map":
+            instrumented.append((op, _timed(arg, stats, lambda _: 1)))
+        elif op == "filter":
+            instrumented.append((op, _timed(arg, stats, bool)))
+        elif op == "flat_map":
+            instrumented.append((op, _timed(lambda element, fn=arg: list(fn(element)), stats, len)))
+        elif op == "take":
+            def count(element, stats=stats, limit=arg):
+                stats.elements_in += 1
+                if stats.elements_out < limit:
+                    stats.elements_out += 1
+                return element
+
+            instrumented.extend((("map", count), (op, arg)))
+        elif op in element_stages:
+            raise ValueError(f"Unknown stage: {op}")
+        else:
+            instrumented.append(("apply", _timed_apply(op, arg, apply, stats)))
+    counted = metered(source, source_stats, "elements_out")
+    return counted, tuple(instrumented), profiles
@@ -0,0 +1,141 @@
+import array
+import operator
+from typing import Callable
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+__all__ = ["vectorized", "is_array_source", "execute_vectorized", "vectorized_prefix"]
+
+# builtins applying element-wise to numpy arrays
+_ELEMENTWISE = frozenset((abs, operator.neg, operator.pos, operator.invert))
+# builtins not applying element-wise (truth value of the whole array) replaced by their numpy equivalent
+_EQUIVALENTS = {operator.not_: np.logical_not} if np is not None else {}
+
+
+def vectorized(fn: Callable) -> Callable:
+    """
+    Mark a function as vectorized: it takes a whole numpy array and returns the array of the results
+    (map) or a boolean mask (filter, find_first), so that Stream can run it once over array sources
+
+    >>> double = vectorized(lambda x: x * 2)
+    >>> double.__vectorized__
+    True
+    """
+    fn.__vectorized__ = True
+    return fn
+
+
+def _is_vectorized(fn) -> bool:
+    return (np is not None and isinstance(fn, np.ufunc)) or fn in _ELEMENTWISE or fn in _EQUIVALENTS or getattr(fn, "__vectorized__", False)
+
+
+def is_array_source(source) -> bool:
+    """
+    True if the source is a numpy array or a typed buffer (array.array, memoryview) and numpy is installed
+    """
+    return np is not None and isinstance(source, (np.ndarray, array.array, memoryview))
+
+
+def _find_first(fn, values):
+    mask = np.asarray(fn(values), dtype=bool)
+    index = int(mask.argmax()) if len(mask) else 0
+    return values[index] if len(mask) and mask[index] else None
+
+
+def _reduce(fn, values):
+    if not len(values):  # like functools.reduce (ufunc.reduce would return the identity of fn)
+        raise TypeError("reduce() of empty iterable with no initial value")
+    return fn.reduce(values)
+
+
+_ARRAY_STAGES = {
+    "map": lambda fn, values: fn(values),
+    "filter": lambda fn, values: values[np.asarray(fn(values), dtype=bool)],
+    "take": lambda limit, values: values[:max(limit, 0)],
+    "sum": lambda _, values: values.sum(),
+    "reduce": _reduce,
+    "find_first": _find_first,
+}
+
+
+def _supported(op: str, arg) -> bool:
+    if op == "take" or op == "sum":
+        return True
+    if op == "reduce":
+        return isinstance(arg, np.ufunc)
+    if op in ("map", "filter", "find_first"):
+        return _is_vectorized(arg)
+    return False
+
+
+def vectorized_prefix(source, stages: list) -> int:
+    """
+    Number of leading stages execute_vectorized runs as array operations, decided without running them
+    (the stages following an aggregation, run on its scalar result, are not counted)
+
+    >>> vectorized_prefix(np.arange(10), [("map", np.square), ("sum", None), ("map", str)])
+    2
+
+    :param source: numpy array or typed buffer
+    :param stages: list of (stage, argument) tuples
+    :return: number of stages
+    """
+    if getattr(source, "ndim", 1) != 1:
+        return 0
+    for index, (op, arg) in enumerate(stages):
+        if not _supported(op, arg):
+            return index
+        if op in ("sum", "reduce", "find_first"):
+            return index + 1
+    return len(stages)
+
+
+def execute_vectorized(source, stages: list):
+    """
+    Run the longest prefix of the stages supported by numpy as array operations (ufuncs and vectorized
+    functions for map, boolean masks for filter, slicing for take, ufunc reduce), without copying the source
+
+    >>> execute_vectorized(np.arange(10), [("map", np.square), ("filter", vectorized(lambda x: x > 10)),
+    ...                                    ("take", 3), ("map", str)])
+    ([16, 25, 36], [('map', <class 'str'>)])
+    >>> execute_vectorized(np.arange(3), [("filter", operator.not_)])
+    (array([0]), [])
+    >>> execute_vectorized(np.arange(3), [("filter", vectorized(lambda x: x > 5)), ("reduce", np.add)])
+    Traceback (most recent call last):
+    ...
+    TypeError: reduce() of empty iterable with no initial value
+
+    :param source: numpy array or typed buffer
+    :param stages: list of (stage, argument) tuples
+    :return: the array (or the scalar produced by an aggregation) and the stages left to run element by element,
+        when stages are left the array is converted to a list of python scalars (faster element by element)
+    """
+    value = source if isinstance(source, np.ndarray) else np.asarray(source)
+    for index, (op, arg) in enumerate(stages):
+        if not isinstance(value, np.ndarray) or value.ndim != 1:
+            return value, stages[index:]
+        if not _supported(op, arg):
+            return value.tolist(), stages[index:]
+        if op in ("map", "filter", "find_first"):
+            arg = _EQUIVALENTS.get(arg, arg)
+        value = _ARRAY_STAGES[op](arg, value)
+    return value, []
+
+
+if __name__ == "__main__":
+    import timeit
+
+    from pytoolz.functional.iterables import Stream
+
+    data = np.random.default_rng(0).random(1000000)
+    values = data.tolist()
+    cases = {
+        "list source": lambda: Stream(values).map(lambda x: x * 2).filter(lambda x: x > 1).sum().to_float(),
+        "array source, vectorized": lambda: Stream(data).map(vectorized(lambda x: x * 2))
+            .filter(vectorized(lambda x: x > 1)).sum().to_float(),
+    }
+    for name, case in cases.items():
+        print(f"{name:<26} {timeit.timeit(case, number=5) / 5 * 1e3:8.1f}ms")
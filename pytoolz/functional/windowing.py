@@ -0,0 +1,147 @@
+import collections
+import heapq
+import itertools
+import pickle
+import tempfile
+from typing import Callable, Iterable, Iterator
+
+from pytoolz.ds.sketch import BloomFilter
+from pytoolz.multiprocessing.pool import chunked
+
+__all__ = ["batch", "window", "group_by", "distinct", "external_sorted"]
+
+_SPILL_BLOCK = 1024  # elements pickled at once in the sorted runs spilled to disk
+
+
+def batch(iterable: Iterable, size: int) -> Iterator[list]:
+    """
+    Group the elements in lists of size elements (the last one can be shorter)
+
+    >>> list(batch(range(5), 2))
+    [[0, 1], [2, 3], [4]]
+    """
+    return chunked(iterable, size)
+
+
+def window(iterable: Iterable, size: int, step: int = 1) -> Iterator[tuple]:
+    """
+    Sliding windows of size elements, a window every step elements (incomplete windows are dropped)
+
+    >>> list(window(range(5), 3))
+    [(0, 1, 2), (1, 2, 3), (2, 3, 4)]
+    >>> list(window(range(7), 2, step=3))
+    [(0, 1), (3, 4)]
+    """
+    if size < 1 or step < 1:
+        raise ValueError(f"Invalid window size/step: {size}/{step}")
+    buffer = collections.deque(maxlen=size)
+    for index, element in enumerate(iterable):
+        buffer.append(element)
+        start = index - size + 1
+        if start >= 0 and start % step == 0:
+            yield tuple(buffer)
+
+
+def group_by(iterable: Iterable, key: Callable, consecutive: bool = False) -> Iterator[tuple]:
+    """
+    Group the elements by key, yielding (key, list of elements) tuples.
+    By default all the groups are kept in memory until the source is consumed, consecutive groups
+    only the runs of elements with the same key (constant memory on sorted sources)
+
+    >>> list(group_by([1, 2, 3, 4, 5], lambda x: x % 2))
+    [(1, [1, 3, 5]), (0, [2, 4])]
+    >>> list(group_by([1, 3, 2, 5], lambda x: x % 2, consecutive=True))
+    [(1, [1, 3]), (0, [2]), (1, [5])]
+    """
+    if consecutive:
+        for group, elements in itertools.groupby(iterable, key):
+            yield group, list(elements)
+        return
+
+    groups = {}
+    for element in iterable:
+        groups.setdefault(key(element), []).append(element)
+    yield from groups.items()
+
+
+def distinct(iterable: Iterable, key: Callable = None, approximate: bool = False,
+             capacity: int = 1000000, error_rate: float = 0.001) -> Iterator:
+    """
+    Drop the duplicated elements (keeping the first occurrence), lazily.
+    The approximate mode tracks the keys in a BloomFilter: constant memory for huge cardinalities,
+    some unique elements (error_rate once capacity keys have been seen) can be dropped
+
+    >>> list(distinct([1, 2, 1, 3, 2]))
+    [1, 2, 3]
+    >>> list(distinct(["a", "B", "A"], key=str.lower))
+    ['a', 'B']
+    >>> list(distinct([1, 2, 1, 3, 2], approximate=True, capacity=100))
+    [1, 2, 3]
+
+    :param iterable: input iterable
+    :param key: function computing the identity of an element, the element itself by default
+    :param approximate: use a bloom filter instead of a set
+    :param capacity: expected number of distinct keys (approximate mode)
+    :param error_rate: false positive rate at capacity (approximate mode)
+    """
+    if approximate:
+        bloom = BloomFilter(capacity, error_rate)
+        for element in iterable:
+            if bloom.add(element if key is None else key(element)):
+                yield element
+        return
+
+    seen = set()
+    for element in iterable:
+        identity = element if key is None else key(element)
+        if identity not in seen:
+            seen.add(identity)
+            yield element
+
+
+def _spill(run: list):
+    spilled = tempfile.TemporaryFile()
+    for block in chunked(run, _SPILL_BLOCK):
+        pickle.dump(block, spilled, protocol=pickle.HIGHEST_PROTOCOL)
+    spilled.seek(0)
+    return spilled
+
+
+def _read_run(spilled) -> Iterator:
+    with spilled:
+        while True:
+            try:
+                block = pickle.load(spilled)
+            except EOFError:
+                return
+            yield from block
+
+
+def external_sorted(iterable: Iterable, key: Callable = None, reverse: bool = False,
+                    buffer_size: int = 100000) -> Iterator:
+    """
+    Stable sort keeping at most buffer_size elements in memory: sorted runs of buffer_size elements
+    are spilled to temporary files (pickled) and merged lazily.
+    Sources smaller than buffer_size are sorted in memory
+
+    >>> list(external_sorted([5, 3, 1, 4, 2], buffer_size=2))
+    [1, 2, 3, 4, 5]
+    >>> list(external_sorted(["bb", "a", "ccc"], key=len, reverse=True, buffer_size=2))
+    ['ccc', 'bb', 'a']
+
+    :param iterable: input iterable (elements must be picklable when spilled)
+    :param key: sort key function
+    :param reverse: sort in descending order
+    :param buffer_size: max number of elements sorted in memory
+    """
+    spilled, last = [], []
+    for run in chunked(iterable, buffer_size):
+        run.sort(key=key, reverse=reverse)
+        if last:
+            spilled.append(_spill(last))
+        last = run
+
+    if not spilled:
+        return iter(last)
+    # runs are merged in source order: heapq.merge is stable
+    return heapq.merge(*map(_read_run, spilled), last, key=key, reverse=reverse)
@@ -1,7 +1,7 @@
 import datetime
 from contextlib import contextmanager
 
-__all__ = ["log_perf_ctx", "log_perf"]
+__all__ = ["log_perf_ctx", "log_perf", "log_perf_report", "format_perf_report", "log_metrics", "format_metrics"]
 
 
 def _log_perf(start, end, msg):
@@ -55,3 +55,84 @@ def log_perf(msg=""):
         return wrapper
 
     return wrapped
+
+
+def format_perf_report(msg, rows):
+    """
+    Format a performance report table: one row per step (stage, elements in/out, seconds, allocated bytes)
+
+    Basic Usage:
+    >>> print(format_perf_report("pipeline", [{"stage": "map(f)", "in": 3, "out": 3, "seconds": 0.0012, "memory": None}]))
+    [pipeline]
+    stage                               in         out    time(ms)  alloc(KiB)
+    map(f)                               3           3       1.200           -
+
+    :param msg: report title
+    :param rows: list of dicts with stage, in, out, seconds and memory keys (None values are printed as -)
+    :return: report string
+    """
+    def cell(value, fmt):
+        return "-" if value is None else format(value, fmt)
+
+    lines = [f"[{msg}]", f"{'stage':<30}{'in':>8}{'out':>12}{'time(ms)':>12}{'alloc(KiB)':>12}"]
+    for row in rows:
+        seconds, memory = row.get("seconds"), row.get("memory")
+        lines.append(f"{row['stage'][:29]:<30}{cell(row.get('in'), 'd'):>8}{cell(row.get('out'), 'd'):>12}"
+                     f"{cell(None if seconds is None else seconds * 1e3, '.3f'):>12}"
+                     f"{cell(None if memory is None else memory / 1024, '.1f'):>12}")
+    return "\n".join(lines)
+
+
+def _log_perf_report(msg, rows):
+    """
+    Simple report log function, log to stdout (used by log_perf_report)
+    """
+    print(format_perf_report(msg, rows))
+
+
+def log_perf_report(msg, rows, log_fn=_log_perf_report):
+    """
+    Log a per step performance report (used by Stream.profile)
+
+    :param msg: report title
+    :param rows: list of dicts with stage, in, out, seconds and memory keys
+    :param log_fn: log function receiving the title and the rows
+    :return:
+    """
+    log_fn(msg, rows)
+
+
+def format_metrics(msg, metrics):
+    """
+    Format a group of metrics on one line (floats with 3 decimals)
+
+    Basic Usage:
+    >>> format_metrics("app.fn", {"hits": 3, "hit_ratio": 0.75})
+    '[app.fn] hits=3 hit_ratio=0.750'
+
+    :param msg: metrics group label
+    :param metrics: dict of name -> value
+    :return: log line
+    """
+    values = " ".join(f"{name}={value:.3f}" if isinstance(value, float) else f"{name}={value}"
+                      for name, value in metrics.items())
+    return f"[{msg}] {values}"
+
+
+def _log_metrics(msg, metrics):
+    """
+    Simple metrics log function, log to stdout (used by log_metrics)
+    """
+    print(format_metrics(msg, metrics))
+
+
+def log_metrics(msg, metrics, log_fn=_log_metrics):
+    """
+    Log a group of metrics (used by the cache LogSink)
+
+    :param msg: metrics group label
+    :param metrics: dict of name -> value
+    :param log_fn: log function receiving the label and the metrics
+    :return:
+    """
+    log_fn(msg, metrics)
@@ -1 +1,4 @@
 from .pool import *
+from .processify import *
+from .sharedmem import *
+from .parallel import *
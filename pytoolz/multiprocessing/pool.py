@@ -1 +1,480 @@
-# TODO complete
+import collections
+import functools
+import importlib
+import itertools
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from multiprocessing import resource_tracker
+from multiprocessing.connection import wait as wait_connections
+from typing import Callable, Iterable, Iterator
+
+from pytoolz.multiprocessing.sharedmem import SHM_THRESHOLD, shm_dumps, shm_loads, shm_unlink
+
+try:
+    import resource
+except ImportError:  # windows: memory based recycling is disabled
+    resource = None
+
+__all__ = ["BACKENDS", "chunked", "executor", "imap_chunks", "WorkerPool", "WorkerCrashedError", "RemoteTraceback",
+           "unwrapped"]
+
+BACKENDS = {
+    "process": ProcessPoolExecutor,
+    "thread": ThreadPoolExecutor,
+}
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    """
+    Lazily split an iterable in lists of (at most) size elements
+
+    >>> list(chunked(range(5), 2))
+    [[0, 1], [2, 3], [4]]
+    """
+    if size < 1:
+        raise ValueError(f"Invalid chunk size: {size}")
+    iterator = iter(iterable)
+    chunk = list(itertools.islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(itertools.islice(iterator, size))
+
+
+def executor(backend: str = "process", workers: int = None) -> Executor:
+    """
+    Create a pool executor: "process" for CPU bound functions (arguments and results must be picklable),
+    "thread" for IO bound functions or functions releasing the GIL
+
+    :param backend: "process" or "thread"
+    :param workers: number of workers, by default the number of CPUs
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend: {backend}, expected one of {sorted(BACKENDS)}")
+    return BACKENDS[backend](max_workers=workers or os.cpu_count())
+
+
+def imap_chunks(fn: Callable, chunks: Iterable, workers: int = None, backend: str = "process",
+                ordered: bool = True, prefetch: int = 2, pool: Executor = None) -> Iterator:
+    """
+    Apply fn to every chunk on a pool, yielding the results while the next chunks are processed.
+    At most workers * prefetch chunks are in flight, so the input is consumed lazily (back pressure)
+
+    Basic Usage:
+    >>> list(imap_chunks(sum, chunked(range(10), 3), workers=2, backend="thread"))
+    [3, 12, 21, 9]
+    >>> sorted(imap_chunks(sum, chunked(range(10), 3), workers=2, backend="thread", ordered=False))
+    [3, 9, 12, 21]
+
+    :param fn: function applied to every chunk (picklable for the process backend)
+    :param chunks: iterable of chunks
+    :param workers: number of workers, by default the number of CPUs
+    :param backend: "process" or "thread"
+    :param ordered: yield the results in the order of the chunks, otherwise as soon as they are ready
+    :param prefetch: number of chunks in flight per worker
+    :param pool: run on this executor (e.g. a WorkerPool, left running) instead of a new one
+    :return: iterator of the results
+    """
+    if pool is None:
+        with executor(backend, workers) as pool:
+            yield from _imap(fn, iter(chunks), pool, workers or os.cpu_count(), ordered, prefetch)
+    else:
+        yield from _imap(fn, iter(chunks), pool, workers or getattr(pool, "workers", os.cpu_count()), ordered,
+                         prefetch)
+
+
+def _imap(fn: Callable, chunks: Iterator, pool: Executor, workers: int, ordered: bool, prefetch: int,
+          on_result: Callable = None, deadline: float = None) -> Iterator:
+    """
+    imap_chunks on a running pool, on_result is called with every result before the next chunk is taken
+    from chunks (e.g. to size it from the measured cost of the previous ones),
+    TimeoutError is raised when a result is not ready at the deadline (time.monotonic())
+    """
+    pending = collections.deque(pool.submit(fn, chunk) for chunk in itertools.islice(chunks, workers * prefetch))
+    try:
+        while pending:
+            timeout = None if deadline is None else max(0, deadline - time.monotonic())
+            if ordered:
+                done = [pending[0]]
+            else:
+                done, _ = wait(pending, timeout, FIRST_COMPLETED)
+                if not done:
+                    raise FutureTimeoutError()
+            for future in done:
+                result = future.result(timeout)
+                pending.remove(future)
+                if on_result is not None:
+                    on_result(result)
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    pending.append(pool.submit(fn, chunk))
+                yield result
+    finally:
+        # the consumer stopped early (take, find_first) or a chunk failed: drop the queued chunks
+        for future in pending:
+            future.cancel()
+
+
+class RemoteTraceback(Exception):
+    """
+    Traceback of an exception raised in a worker process, chained as __cause__ of the re-raised exception
+    """
+
+    def __init__(self, tb: str):
+        super().__init__(tb)
+        self.tb = tb
+
+    def __str__(self):
+        return self.tb
+
+
+class WorkerCrashedError(RuntimeError):
+    """
+    The worker process running a task exited abnormally (killed, segfault, os._exit)
+    """
+
+
+def _peak_memory() -> int:
+    """
+    Peak resident memory of the current process in bytes (0 when unknown)
+    """
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _failure(e: BaseException) -> tuple:
+    return e, "".join(traceback.format_exception(type(e), e, e.__traceback__))
+
+
+def _send(results: tuple, message: tuple, threshold: int):
+    """
+    Send a message to the pool synchronously: nothing is lost if the worker dies right after
+    """
+    connection, lock = results
+    payload, _ = shm_dumps(message, threshold)
+    with lock:
+        connection.send_bytes(payload)
+
+
+def _worker(tasks, results: tuple, initializer: Callable, initargs: tuple, max_tasks: int, max_memory: int,
+            threshold: int):
+    pid = os.getpid()
+    if initializer is not None:
+        try:
+            initializer(*initargs)
+        except BaseException as e:
+            _send(results, ("retired", pid, _failure(e)), threshold)
+            return
+    count = 0
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        task_id, payload = task
+        _send(results, ("started", pid, task_id), threshold)
+        try:
+            fn, args, kwargs = shm_loads(payload)
+            message = ("done", pid, task_id, True, fn(*args, **kwargs))
+        except BaseException as e:
+            message = ("done", pid, task_id, False, _failure(e))
+        try:
+            _send(results, message, threshold)
+        except BaseException as e:  # unpicklable result or exception
+            _send(results, ("done", pid, task_id, False, _failure(e)), threshold)
+        count += 1
+        if (max_tasks and count >= max_tasks) or (max_memory and _peak_memory() >= max_memory):
+            _send(results, ("retired", pid, None), threshold)
+            return
+
+
+class _Unwrapped:
+    """
+    Picklable reference to the function wrapped by a module level decorator: workers import the module
+    and call the __wrapped__ function, not the decorated one
+    """
+    __slots__ = ("module", "qualname", "_fn")
+
+    def __init__(self, module: str, qualname: str):
+        self.module, self.qualname, self._fn = module, qualname, None
+
+    def __reduce__(self):
+        return _Unwrapped, (self.module, self.qualname)
+
+    def __call__(self, *args, **kwargs):
+        if self._fn is None:
+            fn = importlib.import_module(self.module)
+            for name in self.qualname.split("."):
+                fn = getattr(fn, name)
+            self._fn = fn.__wrapped__
+        return self._fn(*args, **kwargs)
+
+
+def unwrapped(decorated: Callable) -> Callable:
+    """
+    Picklable callable running the original function of a module level decorated function
+    (functools.wraps sets __wrapped__), so that it can be sent to the workers of a process pool
+    """
+    return _Unwrapped(decorated.__module__, decorated.__qualname__)
+
+
+def _apply_chunk(fn: Callable, chunk: list) -> list:
+    return [fn(*args) for args in chunk]
+
+
+class WorkerPool(Executor):
+    """
+    Pool of long-lived worker processes (a concurrent.futures Executor): workers are started once (lazily,
+    at the first submit) and reused by every task, the initializer runs once per worker to pay heavy imports
+    and setups only once.
+    Workers are recycled (replaced by a fresh process) after max_tasks_per_worker tasks or when their peak
+    memory reaches max_memory bytes, a worker dying while running a task fails its future with WorkerCrashedError
+
+    Basic Usage:
+    >>> with WorkerPool(2) as pool:
+    ...     future = pool.submit(pow, 2, 10)
+    ...     future.result(), list(pool.map(pow, [2, 3], [2, 2])), sorted(pool.imap_unordered(abs, [-1, -2]))
+    (1024, [4, 9], [1, 2])
+
+    Recycling: 4 tasks on a single worker replaced every 2 tasks
+    >>> with WorkerPool(1, max_tasks_per_worker=2) as pool:
+    ...     len({pool.submit(os.getpid).result() for _ in range(4)})
+    2
+
+    Tasks submitted before shutdown are completed, recycled workers are replaced until then
+    >>> pool = WorkerPool(2, max_tasks_per_worker=1)
+    >>> futures = [pool.submit(abs, -number) for number in range(6)]
+    >>> pool.shutdown(wait=True)
+    >>> [future.result() for future in futures]
+    [0, 1, 2, 3, 4, 5]
+
+    :param workers: number of worker processes, by default the number of CPUs
+    :param initializer: function called once by every worker at start
+    :param initargs: arguments of the initializer
+    :param max_tasks_per_worker: recycle a worker after this many tasks (None: never)
+    :param max_memory: recycle a worker once its peak resident memory reaches this many bytes (None: never)
+    :param context: multiprocessing start method ("fork", "spawn", "forkserver"), the platform default if None
+    :param shm_threshold: arguments and results buffers (bytes, bytearray, memoryview, numpy arrays) of at least
+        this many bytes are moved through shared memory instead of being copied through pipes (None: never)
+    """
+
+    def __init__(self, workers: int = None, initializer: Callable = None, initargs: tuple = (),
+                 max_tasks_per_worker: int = None, max_memory: int = None, context: str = None,
+                 shm_threshold: int = SHM_THRESHOLD):
+        if workers is not None and workers < 1:
+            raise ValueError(f"Invalid number of workers: {workers}")
+        self.workers = workers or os.cpu_count()
+        self._context = multiprocessing.get_context(context)
+        self._worker_args = (initializer, initargs, max_tasks_per_worker, max_memory, shm_threshold)
+        self._shm_threshold = shm_threshold
+        self._tasks = self._context.Queue()
+        self._reader, writer = self._context.Pipe(duplex=False)
+        self._results = (writer, self._context.Lock())
+        self._processes = {}  # pid -> Process
+        self._running = {}  # pid -> id of the task running on the worker
+        self._futures = {}  # task id -> Future
+        self._segments = {}  # task id -> shared memory segments of the arguments
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._manager = None
+        self._shutdown = False
+        self._stopping = False
+        self._broken = None
+
+    def _spawn(self):
+        process = self._context.Process(target=_worker, args=(self._tasks, self._results, *self._worker_args),
+                                        daemon=True)
+        process.start()
+        self._processes[process.pid] = process
+
+    def _start(self):
+        # workers share the tracker of the segments with the pool: each side unlinks what the other one created
+        resource_tracker.ensure_running()
+        for _ in range(self.workers):
+            self._spawn()
+        self._manager = threading.Thread(target=self._manage, name="WorkerPool manager", daemon=True)
+        self._manager.start()
+
+    def _resolve(self, task_id: int, ok: bool, value):
+        with self._lock:
+            future = self._futures.pop(task_id, None)
+        # the worker unlinks the segments it maps, the ones left (arguments not loaded) are unlinked here
+        shm_unlink(self._segments.pop(task_id, ()))
+        if future is None or future.done():
+            return
+        if ok:
+            future.set_result(value)
+        else:
+            error, tb = value
+            if tb:
+                error.__cause__ = RemoteTraceback(tb)
+            future.set_exception(error)
+
+    def _handle(self, message: tuple):
+        kind, pid = message[0], message[1]
+        if kind == "started":
+            with self._lock:
+                future = self._futures.get(message[2])
+                self._running[pid] = message[2]
+            if future is not None and not future.set_running_or_notify_cancel():
+                # cancelled while queued: the worker runs it anyway, the result is dropped
+                with self._lock:
+                    self._futures.pop(message[2], None)
+        elif kind == "done":
+            self._running.pop(pid, None)
+            self._resolve(*message[2:])
+        elif kind == "wakeup":  # shutdown: the manager checks whether the workers can be stopped
+            pass
+        elif kind == "retired":
+            self._processes.pop(pid).join()
+            if message[2] is not None:
+                # the initializer failed: fail the queued tasks instead of respawning forever
+                self._break(*message[2])
+            else:
+                self._respawn()
+
+    def _pending(self) -> bool:
+        """
+        True while submitted tasks are not completed (the lock must be held)
+        """
+        return any(not future.done() for future in self._futures.values())
+
+    def _respawn(self):
+        with self._lock:
+            # after shutdown workers are still replaced until the tasks submitted before it are completed
+            if not self._broken and (not self._shutdown or self._pending()):
+                self._spawn()
+
+    def _stop_workers(self):
+        """
+        Once shut down and the submitted tasks completed, send a stop sentinel to every worker
+        """
+        with self._lock:
+            if not self._shutdown or self._stopping or self._pending():
+                return
+            self._stopping = True
+            workers = len(self._processes)
+        for _ in range(workers):
+            self._tasks.put(None)
+
+    def _break(self, error: BaseException, tb: str):
+        error.__cause__ = RemoteTraceback(tb)
+        with self._lock:
+            self._shutdown = True
+            self._broken = f"Worker initializer failed: {error!r}"
+            futures, self._futures = self._futures, {}
+        for future in futures.values():
+            if not future.done():
+                future.set_exception(error)
+
+    def _check_workers(self):
+        for pid, process in list(self._processes.items()):
+            if process.exitcode is None:
+                continue
+            del self._processes[pid]
+            task_id = self._running.pop(pid, None)
+            if task_id is not None:
+                self._resolve(task_id, False, (
+                    WorkerCrashedError(f"Worker {pid} exited with code {process.exitcode} running the task"), None))
+            self._respawn()
+
+    def _manage(self):
+        while self._processes:
+            sentinels = {process.sentinel for process in self._processes.values()}
+            for ready in wait_connections([self._reader, *sentinels]):
+                if ready is self._reader:
+                    self._handle(shm_loads(self._reader.recv_bytes()))
+            while self._reader.poll():  # messages sent by a worker before exiting
+                self._handle(shm_loads(self._reader.recv_bytes()))
+            self._check_workers()
+            self._stop_workers()
+        # every worker exited: nothing can complete the tasks left
+        with self._lock:
+            futures, self._futures = self._futures, {}
+        for segments in self._segments.values():
+            shm_unlink(segments)
+        for future in futures.values():
+            if not future.done():
+                future.set_exception(WorkerCrashedError(self._broken or "WorkerPool shut down"))
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """
+        Schedule fn(*args, **kwargs) on a worker (fn, arguments and result must be picklable)
+        """
+        future = Future()
+        payload, segments = shm_dumps((fn, args, kwargs), self._shm_threshold)
+        with self._lock:
+            if self._broken:
+                shm_unlink(segments)
+                raise WorkerCrashedError(self._broken)
+            if self._shutdown:
+                shm_unlink(segments)
+                raise RuntimeError("cannot schedule new tasks after shutdown")
+            if self._manager is None:
+                self._start()
+            task_id = next(self._ids)
+            self._futures[task_id] = future
+            if segments:
+                self._segments[task_id] = segments
+        self._tasks.put((task_id, payload))
+        return future
+
+    def map(self, fn: Callable, *iterables: Iterable, timeout: float = None, chunksize: int = 1) -> Iterator:
+        """
+        Ordered results of fn over the zipped iterables, lazily: chunks of chunksize calls are sent to the workers
+        at most 2 chunks per worker ahead of the consumer.
+        Like Executor.map, TimeoutError is raised if a result is not ready timeout seconds after the call to map
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        chunks = _imap(functools.partial(_apply_chunk, fn), chunked(zip(*iterables), chunksize), self, self.workers,
+                       True, 2, deadline=deadline)
+        return itertools.chain.from_iterable(chunks)
+
+    def imap_unordered(self, fn: Callable, iterable: Iterable, chunksize: int = 1) -> Iterator:
+        """
+        Results of fn over the iterable as soon as they are ready
+        """
+        chunks = imap_chunks(functools.partial(_apply_chunk, fn), chunked(zip(iterable), chunksize), pool=self,
+                             ordered=False)
+        return itertools.chain.from_iterable(chunks)
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        with self._lock:
+            self._shutdown = True
+            futures = list(self._futures.values()) if cancel_futures else []
+        for future in futures:
+            future.cancel()
+        if self._manager is None:
+            return
+        # workers are stopped by the manager once the tasks already submitted are completed
+        _send(self._results, ("wakeup", None), None)
+        if wait:
+            self._manager.join()
+
+
+if __name__ == "__main__":
+    import time
+
+    from pytoolz.multiprocessing.processify import processify
+
+    def square(x):
+        return x * x
+
+    spawned = processify(square)
+    calls = 50
+    with WorkerPool(2) as pool:
+        pool.submit(square, 0).result()  # warm up
+        cases = {
+            "process per call (processify)": lambda: [spawned(x).result() for x in range(calls)],
+            "WorkerPool.submit": lambda: [pool.submit(square, x).result() for x in range(calls)],
+        }
+        for name, case in cases.items():
+            start = time.perf_counter()
+            case()
+            print(f"{name:<30} {(time.perf_counter() - start) / calls * 1e3:8.3f}ms per call")
@@ -1,61 +1,171 @@
+import asyncio
+import multiprocessing
 import os
-import sys
-import traceback
-from functools import wraps
-from multiprocessing import Process, Queue
+import threading
+from concurrent.futures import Executor, Future
+from functools import partial, wraps
+from multiprocessing import resource_tracker
+from multiprocessing.connection import wait
 
-__all__ = ["processify", ]
+from pytoolz.multiprocessing.pool import RemoteTraceback, WorkerCrashedError, _failure, unwrapped
+from pytoolz.multiprocessing.sharedmem import SHM_THRESHOLD, shm_dumps, shm_loads, shm_unlink
 
+__all__ = ["processify", "aprocessify"]
 
-def processify(func):
+
+def _run(connection, call, threshold: int):
+    try:
+        # forked children inherit the call, the others receive it pickled (large buffers in shared memory)
+        func, args, kwargs = shm_loads(call) if isinstance(call, bytes) else call
+        message = (True, func(*args, **kwargs))
+    except BaseException as e:
+        message = (False, _failure(e))
+    try:
+        connection.send_bytes(shm_dumps(message, threshold)[0])
+    except BaseException as e:  # unpicklable result or exception
+        connection.send_bytes(shm_dumps((False, _failure(e)), threshold)[0])
+    connection.close()
+
+
+def _supervise(future: Future, process, connection, timeout: float, segments: list):
+    """
+    Wait for the result of the child (or its exit) without blocking the caller,
+    kill it when the timeout expires
+    """
+    try:
+        _wait_result(future, process, connection, timeout)
+    finally:
+        # arguments segments are unlinked by the child, unless it didn't get that far
+        shm_unlink(segments)
+
+
+def _wait_result(future: Future, process, connection, timeout: float):
+    with connection:
+        if not wait([connection], timeout):
+            process.kill()
+            process.join()
+            future.set_exception(TimeoutError(f"{process.name} timed out after {timeout}s, killed"))
+            return
+        try:
+            ok, value = shm_loads(connection.recv_bytes())
+        except EOFError:  # the child exited without sending anything
+            process.join()
+            future.set_exception(WorkerCrashedError(f"{process.name} exited with code {process.exitcode}"))
+            return
+        except BaseException as e:  # the result can't be unpickled here
+            process.join()
+            future.set_exception(e)
+            return
+    process.join()
+    if ok:
+        future.set_result(value)
+    else:
+        error, tb = value
+        error.__cause__ = RemoteTraceback(tb)
+        future.set_exception(error)
+
+
+def processify(func=None, pool: Executor = None, timeout: float = None, shm_threshold: int = SHM_THRESHOLD):
     """
     Decorator to run a function as a process.
     Be sure that every argument and the return value
     is *pickable*.
-    The created process is joined, so the service does not
-    run in parallel.
+    Every call starts a process and returns a concurrent.futures.Future, so calls run concurrently:
+    an exception raised by the function is re-raised by result() with the remote traceback chained (__cause__),
+    a child exiting abnormally (segfault, OOM kill) fails the future with WorkerCrashedError,
+    a call running for more than timeout seconds is killed and fails with TimeoutError.
+
+    >>> @processify
+    ... def pid():
+    ...     return os.getpid()
+    >>> pid().result() != os.getpid()
+    True
+    >>> processify(os._exit)(3).result()  # doctest: +ELLIPSIS
+    Traceback (most recent call last):
+    ...
+    pytoolz.multiprocessing.pool.WorkerCrashedError: Process-... exited with code 3
+
+    With a pool (e.g. a WorkerPool) calls are routed to its warm workers instead of
+    spawning a process per call (the function must be defined at module level):
+
+        pool = WorkerPool(4, initializer=load_model)
+
+        @processify(pool=pool)
+        def predict(features):
+            ...
+
+    :param pool: executor running the calls
+    :param timeout: seconds after which a call is killed (not supported with a pool: workers are shared)
+    :param shm_threshold: arguments and results buffers (bytes, bytearray, memoryview, numpy arrays) of at least
+        this many bytes are moved through shared memory instead of being copied through pipes (None: never)
     """
+    if func is None:
+        return partial(processify, pool=pool, timeout=timeout, shm_threshold=shm_threshold)
+    if pool is not None and timeout is not None:
+        raise ValueError("timeout kills the process of the call: not supported with a pool")
 
-    def process_func(q, *args, **kwargs):
-        try:
-            ret = func(*args, **kwargs)
-        except Exception:
-            ex_type, ex_value, tb = sys.exc_info()
-            error = ex_type, ex_value, ''.join(traceback.format_tb(tb))
-            ret = None
+    @wraps(func)
+    def wrapper(*args, **kwargs) -> Future:
+        if pool is not None:
+            return pool.submit(target, *args, **kwargs)
+
+        if multiprocessing.get_start_method() == "fork":
+            # the child inherits the function and the arguments: nothing to copy
+            call, segments = (func, args, kwargs), []
         else:
-            error = None
+            call, segments = shm_dumps((target, args, kwargs), shm_threshold)
+        resource_tracker.ensure_running()  # shared with the child, which unlinks the segments created here
+        reader, writer = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=_run, args=(writer, call, shm_threshold), daemon=True)
+        try:
+            process.start()
+        except BaseException:
+            shm_unlink(segments)
+            raise
+        writer.close()
+        future = Future()
+        future.set_running_or_notify_cancel()
+        threading.Thread(target=_supervise, args=(future, process, reader, timeout, segments), daemon=True).start()
+        return future
 
-        q.put((ret, error))
+    target = unwrapped(wrapper)
+    return wrapper
 
-    # register original function with different name
-    # in sys.modules so it is pickable
-    process_func.__name__ = func.__name__ + 'processify_func'
-    setattr(sys.modules[__name__], process_func.__name__, process_func)
 
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        q = Queue()
-        p = Process(target=process_func, args=[q] + list(args), kwargs=kwargs)
-        p.start()
-        print('Started {}'.format(p.name))
-        ret, error = q.get()
-        p.join()
+def aprocessify(func=None, pool: Executor = None, timeout: float = None, shm_threshold: int = SHM_THRESHOLD):
+    """
+    Awaitable processify: the decorated function is a coroutine function awaiting the process
 
-        if error:
-            ex_type, ex_value, tb_str = error
-            message = '%s (in subprocess)\n%s' % (ex_value.message, tb_str)
-            raise ex_type(message)
+    >>> @aprocessify
+    ... def add(x, y):
+    ...     return x + y
+    >>> async def main():
+    ...     return await asyncio.gather(add(1, 2), add(3, 4))
+    >>> asyncio.run(main())
+    [3, 7]
+    """
+    if func is None:
+        return partial(aprocessify, pool=pool, timeout=timeout, shm_threshold=shm_threshold)
+    call = processify(func, pool=pool, timeout=timeout, shm_threshold=shm_threshold)
 
-        return ret
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await asyncio.wrap_future(call(*args, **kwargs))
 
     return wrapper
 
 
 if __name__ == "__main__":
+    import time
+
+
     @processify
-    def test():
-        print(os.getpid())
+    def work(seconds):
+        time.sleep(seconds)
+        return os.getpid()
 
 
-    test()
+    start = time.perf_counter()
+    futures = [work(0.2) for _ in range(8)]
+    print(len({future.result() for future in futures}), "processes",
+          f"{(time.perf_counter() - start) * 1e3:.0f}ms (8 x 200ms calls)")
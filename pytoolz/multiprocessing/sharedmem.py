@@ -0,0 +1,167 @@
+import io
+import os
+import pickle
+from multiprocessing.reduction import ForkingPickler
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, Tuple
+
+__all__ = ["SHM_THRESHOLD", "shm_dumps", "shm_loads", "shm_unlink"]
+
+SHM_THRESHOLD = 1 << 20  # buffers of at least 1MiB are moved through shared memory
+
+_BUFFERS = (bytes, bytearray, memoryview)
+
+
+class _Segment(SharedMemory):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # the mapping holds its own descriptor: close this one now, close() may not get that far
+        if getattr(self, "_fd", -1) >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def close(self):
+        try:
+            super().close()
+        except BufferError:
+            # objects built on the segment (zero-copy arrays, memoryviews) are still alive:
+            # the memory is unmapped (and its descriptor closed) with the last of them
+            pass
+
+
+def _rebuild(kind: type, buffer, format: str, shape: tuple):
+    if kind is not memoryview:
+        return kind(buffer)
+    view = memoryview(buffer)
+    if view.format == format and view.shape == shape:
+        return view
+    return view.cast("B").cast(format, shape)
+
+
+class _OutOfBand:
+    """
+    bytes, bytearray and memoryview are pickled in-band by the pickle module (or not at all, memoryview):
+    wrapped, they are pickled as a protocol 5 PickleBuffer
+    """
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __reduce_ex__(self, protocol):
+        value = self.value
+        if isinstance(value, memoryview):
+            buffer = value if value.c_contiguous else value.tobytes()
+            return _rebuild, (memoryview, pickle.PickleBuffer(buffer), value.format, value.shape)
+        return _rebuild, (type(value), pickle.PickleBuffer(value), None, None)
+
+
+def _share(value, threshold: int, depth: int = 2):
+    """
+    Wrap the large buffers found in the value, in its tuples and dicts (arguments, keyword arguments,
+    results) up to depth levels
+    """
+    if isinstance(value, _BUFFERS):
+        return _OutOfBand(value) if memoryview(value).nbytes >= threshold else value
+    if depth and type(value) is tuple:
+        return tuple(_share(element, threshold, depth - 1) for element in value)
+    if depth and type(value) is dict:
+        return {key: _share(element, threshold, depth - 1) for key, element in value.items()}
+    return value
+
+
+def shm_dumps(obj, threshold: int = SHM_THRESHOLD) -> Tuple[bytes, List[str]]:
+    """
+    Pickle an object moving its buffers of at least threshold bytes (bytes, bytearray, memoryview, numpy arrays)
+    to shared memory segments (pickle protocol 5 out-of-band buffers): the payload carries only their names.
+    Segments are unlinked by shm_loads: the sender must call shm_unlink when the payload is not delivered
+
+    >>> payload, segments = shm_dumps((b"small", bytes(2 ** 20)))
+    >>> len(payload) < 1024, len(segments)
+    (True, 1)
+    >>> small, large = shm_loads(payload)
+    >>> small, len(large)
+    (b'small', 1048576)
+
+    :param obj: object to pickle
+    :param threshold: min size in bytes of a buffer moved to shared memory (None: never)
+    :return: the payload and the names of the segments created
+    """
+    segments = []
+
+    def out_of_band(buffer: pickle.PickleBuffer) -> bool:
+        with buffer.raw() as raw:
+            if threshold is None or raw.nbytes < threshold:
+                return True
+            segment = _Segment(create=True, size=raw.nbytes)
+            segment.buf[:raw.nbytes] = raw
+            segments.append((segment.name, raw.nbytes))
+            segment.close()
+        return False
+
+    stream = io.BytesIO()
+    try:
+        pickler = pickle.Pickler(stream, 5, buffer_callback=out_of_band)
+        pickler.dispatch_table = ForkingPickler(stream).dispatch_table  # multiprocessing reducers (connections...)
+        pickler.dump(obj if threshold is None else _share(obj, threshold))
+    except BaseException:
+        shm_unlink([name for name, _ in segments])
+        raise
+    # segments are listed after the pickled object, the last 4 bytes are the size of the list
+    size = stream.write(pickle.dumps(segments, pickle.HIGHEST_PROTOCOL))
+    stream.write(size.to_bytes(4, "big"))
+    return stream.getvalue(), [name for name, _ in segments]
+
+
+def shm_loads(payload: bytes):
+    """
+    Unpickle a payload built by shm_dumps: buffers in shared memory are not copied (numpy arrays and memoryviews
+    are views of the segments, bytes and bytearray copies), segments are unlinked once mapped
+    """
+    view = memoryview(payload)
+    size = int.from_bytes(view[-4:], "big")
+    buffers, opened = [], []
+    try:
+        for name, nbytes in pickle.loads(view[-4 - size:-4]):
+            segment = _Segment(name=name)
+            opened.append(segment)
+            # unlinked right away: the memory is released when the last process unmaps it, even on crashes
+            segment.unlink()
+            buffers.append(segment.buf[:nbytes])
+        return pickle.loads(view[:-4 - size], buffers=buffers)
+    finally:
+        del buffers
+        for segment in opened:
+            segment.close()
+
+
+def shm_unlink(segments: List[str]):
+    """
+    Unlink the segments of an undelivered payload (the ones already unlinked by shm_loads are skipped)
+    """
+    for name in segments:
+        try:
+            segment = _Segment(name=name)
+        except FileNotFoundError:
+            continue
+        segment.close()
+        try:
+            segment.unlink()
+        except FileNotFoundError:
+            pass
+
+
+if __name__ == "__main__":
+    import time
+
+    import numpy as np
+
+    from pytoolz.multiprocessing.pool import WorkerPool
+
+    data = np.random.default_rng(0).random(25 * 10 ** 6)  # 200MB
+    for name, threshold in (("pipe (pickled copies)", None), ("shared memory", SHM_THRESHOLD)):
+        with WorkerPool(1, shm_threshold=threshold) as pool:
+            pool.submit(abs, 0).result()  # warm up
+            start = time.perf_counter()
+            pool.submit(np.negative, data).result()
+            print(f"{name:<22} 200MB argument and result {(time.perf_counter() - start) * 1e3:8.1f}ms")
@@ -6,7 +6,7 @@ try:
 except ImportError:
     import json
 
-__all__ = ["BaseSerializer", "Json", "Dict", "Pickle"]
+__all__ = ["BaseSerializer", "Json", "Dict", "Pickle", "Msgpack"]
 
 
 class BaseSerializer:
@@ -38,14 +38,32 @@ class Json(BaseSerializer):
 
 class Pickle(BaseSerializer):
     """
-    From * to Pickle
+    From * to Pickle (highest protocol available, 5 on python >= 3.8)
+
+    >>> Pickle(Pickle({"a": [1, 2]}).serialize()).deserialize()
+    {'a': [1, 2]}
+    """
+    protocol = pickle.HIGHEST_PROTOCOL
+
+    def serialize(self):
+        return pickle.dumps(self._data, protocol=self.protocol)
+
+    def deserialize(self):
+        return pickle.loads(self._data)
+
+
+class Msgpack(BaseSerializer):
+    """
+    From * to MessagePack (requires msgpack)
     """
 
     def serialize(self):
-        return pickle.dumps(self._data)
+        import msgpack
+        return msgpack.packb(self._data, use_bin_type=True)
 
     def deserialize(self):
-        return pickle.loads(str(self._data))
+        import msgpack
+        return msgpack.unpackb(self._data, raw=False)
 
 
 class Dict(BaseSerializer):
@@ -21,13 +21,17 @@ setup(
     license='Creative Commons Attribution-Noncommercial-Share Alike license',
     long_description=long_description,
     long_description_content_type='text/markdown',
+    python_requires='>=3.8',  # multiprocessing.shared_memory, pickle protocol 5
     classifiers=[
         # Trove classifiers
         # Full list: https://pypi.python.org/pypi?%3Aaction=list_classifiers
         'License :: OSI Approved :: MIT License',
         'Programming Language :: Python',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
         'Programming Language :: Python :: Implementation :: CPython',
         'Programming Language :: Python :: Implementation :: PyPy'
     ],